@@ -1,10 +1,15 @@
+import asyncio
 import openai
 import pandas as pd
-import os
-from openai import OpenAI
+import random
+from openai import AsyncOpenAI
 from tqdm import tqdm 
+from dataset_sink import CsvSink, ParquetSink
 
-client = OpenAI()
+SCENARIO_COLUMNS = ["Source Name", "Source Type", "Source Description", "Target Name", "Target Type",
+                    "Target Description", "Relationship", "Auth Required", "Encryption", "Encryption Type",
+                    "Data Format", "Frequency", "Data Integrity", "Access Type", "Access Target",
+                    "Network Protocol", "Communication Channel", "Credential Storage", "Interactor", "Threat"]
 
 def parse_scenario_lines(lines):
     """Parse lines from a scenario, including handling structured table-like data."""
@@ -13,44 +18,31 @@ def parse_scenario_lines(lines):
         # Check if the line looks like a table row or structured data
         if '|' in line:
             parts = [part.strip() for part in line.split('|') if part.strip()]
-            if len(parts) == 20:  # Assuming we know the table structure exactly
-                headers = ["Source Name", "Source Type", "Source Description", "Target Name", "Target Type", 
-                           "Target Description", "Relationship", "Auth Required", "Encryption", "Encryption Type", 
-                           "Data Format", "Frequency", "Data Integrity", "Access Type", "Access Target", 
-                           "Network Protocol", "Communication Channel", "Credential Storage", "Interactor", "Threat"]
-                scenario_dict.update(dict(zip(headers, parts)))
+            if len(parts) == len(SCENARIO_COLUMNS):  # Assuming we know the table structure exactly
+                scenario_dict.update(dict(zip(SCENARIO_COLUMNS, parts)))
         elif ':' in line:
             key, value = line.split(':', 1)
             scenario_dict[key.strip()] = value.strip()
     return scenario_dict
 
-def generate_dfd_scenarios(api_key, num_scenarios):
-    openai.api_key = api_key
-    scenarios_per_request = 20  # Adjust based on what the API can handle comfortably
-    total_scenarios = []
-
-     # Initialize tqdm progress bar
-    pbar = tqdm(total=num_scenarios, desc="Generating scenarios")
-
-    for _ in range(0, num_scenarios, scenarios_per_request):
-        scenarios_needed = min(scenarios_per_request, num_scenarios - len(total_scenarios))
-        prompt = (
-            f"Generate {scenarios_needed} DFD scenarios with the following fields: "
-            "Source Name, Source Type, Source Description, Target Name, Target Type, Target Description, "
-            "Relationship, Auth Required, Encryption, Encryption Type, Data Format, Frequency, Data Integrity, "
-            "Access Type, Access Target, Network Protocol, Communication Channel, Credential Storage, Interactor, Threat."
-            "Each scenario should be unique and reflect a real-world use case.\n"
-            "For the threats, please only use one of the following:\n"
-            "    Cross-Site Request Forgery (CSRF)\n"
-            "    Denial of Service (DoS)\n"
-            "    Distributed Denial of Service (DDoS)\n"
-            "    Drive-by Download Attacks\n"
-            "    Password Attack\n"
-            "    Credential Stuffing\n"
-            "    Side-Channel Attack\n"
-            "    Directory Traversal\n"
-            "    Remote Code Execution (RCE)\n"
-            """It is important that each row represents a realistic relationship between two entities, therefore a relationship with no threat of course also is possible.
+def build_prompt(scenarios_needed):
+    prompt = (
+        f"Generate {scenarios_needed} DFD scenarios with the following fields: "
+        "Source Name, Source Type, Source Description, Target Name, Target Type, Target Description, "
+        "Relationship, Auth Required, Encryption, Encryption Type, Data Format, Frequency, Data Integrity, "
+        "Access Type, Access Target, Network Protocol, Communication Channel, Credential Storage, Interactor, Threat."
+        "Each scenario should be unique and reflect a real-world use case.\n"
+        "For the threats, please only use one of the following:\n"
+        "    Cross-Site Request Forgery (CSRF)\n"
+        "    Denial of Service (DoS)\n"
+        "    Distributed Denial of Service (DDoS)\n"
+        "    Drive-by Download Attacks\n"
+        "    Password Attack\n"
+        "    Credential Stuffing\n"
+        "    Side-Channel Attack\n"
+        "    Directory Traversal\n"
+        "    Remote Code Execution (RCE)\n"
+        """It is important that each row represents a realistic relationship between two entities, therefore a relationship with no threat of course also is possible.
             For the Source Type and Target Type, categorize each Source into one of the following: Database, Web Application, Device, Service, User.
             For the Auth Required, choose one of the following: Yes, No.
             For the Encryption, choose one of the following: Yes, No.
@@ -65,43 +57,144 @@ def generate_dfd_scenarios(api_key, num_scenarios):
             For the Credential Storage, choose one of the following: Plain Text, Hashed, Encrypted, Environment Variable, Secure Vault.
             For the Interactor, choose one of the following: User, System, Application, Device, None.
             """
-        )
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        scenarios_text = response.choices[0].message.content.strip()
-        scenarios = scenarios_text.split("\n\n")
-        
-        for scenario in scenarios:
-            lines = scenario.split('\n')
-            parsed_scenario = parse_scenario_lines(lines)
-            if parsed_scenario:
-                total_scenarios.append(parsed_scenario)
-        pbar.update(scenarios_needed)  # Update progress bar after each batch
-    
-    pbar.close()  # Close the progress bar after all scenarios are processed
+    )
+    return prompt
+
+def parse_response(scenarios_text):
+    """Split a completion into scenarios and parse each one."""
+    total_scenarios = []
+    for scenario in scenarios_text.strip().split("\n\n"):
+        lines = scenario.split('\n')
+        parsed_scenario = parse_scenario_lines(lines)
+        if parsed_scenario:
+            total_scenarios.append(parsed_scenario)
     return total_scenarios
 
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if self._last is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def _retry_delay(error, attempt, base_delay=1.0, max_delay=60.0):
+    # Prefer the server's Retry-After, otherwise exponential backoff with jitter
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(float(retry_after), max_delay)
+            except ValueError:
+                pass
+    return min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def _is_retryable(error):
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+async def request_scenarios(client, prompt, bucket, model="gpt-3.5-turbo", max_retries=6):
+    """Send one completion request, retrying 429/5xx/connection errors with backoff."""
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+            return response.choices[0].message.content
+        except openai.OpenAIError as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            await asyncio.sleep(_retry_delay(e, attempt))
+
+async def generate_dfd_scenarios_async(api_key, num_scenarios, concurrency=8, requests_per_minute=60,
+                                       base_url=None, model="gpt-3.5-turbo"):
+    """Generate scenarios with up to `concurrency` requests in flight.
+
+    Requests are paced by a token bucket (`requests_per_minute`) and retried
+    with exponential backoff on rate limits and server errors. `base_url`
+    points the client at another completions endpoint, e.g. a local stub.
+    """
+    client = AsyncOpenAI(api_key=api_key or None, base_url=base_url, max_retries=0)
+    scenarios_per_request = 20  # Adjust based on what the API can handle comfortably
+    batch_sizes = [
+        min(scenarios_per_request, num_scenarios - start)
+        for start in range(0, num_scenarios, scenarios_per_request)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(requests_per_minute / 60, capacity=concurrency)
+
+    # The progress bar counts scenarios actually parsed from the responses
+    pbar = tqdm(total=num_scenarios, desc="Generating scenarios")
+
+    async def generate_batch(scenarios_needed):
+        async with semaphore:
+            try:
+                scenarios_text = await request_scenarios(client, build_prompt(scenarios_needed), bucket, model=model)
+            except openai.OpenAIError as e:
+                tqdm.write(f"Request for {scenarios_needed} scenarios failed: {e}")
+                return []
+        scenarios = parse_response(scenarios_text or "")
+        pbar.update(len(scenarios))
+        return scenarios
+
+    try:
+        batches = await asyncio.gather(*(generate_batch(n) for n in batch_sizes))
+    finally:
+        pbar.close()
+        await client.close()
+    return [scenario for batch in batches for scenario in batch]
+
+def generate_dfd_scenarios(api_key, num_scenarios, concurrency=8, requests_per_minute=60, base_url=None):
+    return asyncio.run(generate_dfd_scenarios_async(
+        api_key, num_scenarios, concurrency=concurrency,
+        requests_per_minute=requests_per_minute, base_url=base_url
+    ))
+
 def create_dataframe(scenarios):
     return pd.DataFrame(scenarios)
 
+def project_scenarios(df):
+    """Keep only the dataset's columns; the model sometimes emits extra keys such as "Scenario 1"."""
+    extra = [column for column in df.columns if column not in SCENARIO_COLUMNS]
+    if extra:
+        tqdm.write(f"Dropping keys that are not dataset columns: {extra}")
+    return df.reindex(columns=SCENARIO_COLUMNS)
+
 def append_to_csv(df, filename):
-    if os.path.exists(filename):
-        existing_df = pd.read_csv(filename)
-        combined_df = pd.concat([existing_df, df], ignore_index=True)
-    else:
-        combined_df = df
-    combined_df.to_csv(filename, index=False)
+    # Writes only the new rows; the existing file is never read back in
+    return CsvSink(filename).append(project_scenarios(df))
+
+def append_to_parquet(df, directory):
+    return ParquetSink(directory).append(project_scenarios(df))
 
 if __name__ == "__main__":
     api_key = "" #Insert OpenAI Key here
     num_scenarios = 100 #anzahl zeilen hier anpassen
-    scenarios = generate_dfd_scenarios(api_key, num_scenarios)
+    concurrency = 8 #parallele Anfragen
+    requests_per_minute = 60 #an das Rate Limit des Accounts anpassen
+    scenarios = generate_dfd_scenarios(api_key, num_scenarios, concurrency, requests_per_minute)
     df = create_dataframe(scenarios)
     append_to_csv(df, "threats.csv")
     print("DFD scenarios generated and saved.")
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import random
+import re
+import time
+
+from aiohttp import web
+
+# Local stand-in for the chat completions endpoint, for exercising
+# generate_dfd_scenarios without an API key:
+#   python completions_stub.py --latency 1.0 --error-rate 0.2
+# and pass base_url="http://127.0.0.1:8600/v1" to the generator.
+
+FIELDS = [
+    ("Source Name", "Billing Service"), ("Source Type", "Service"),
+    ("Source Description", "Handles invoices"), ("Target Name", "Customer DB"),
+    ("Target Type", "Database"), ("Target Description", "Stores customer data"),
+    ("Relationship", "Writes invoices"), ("Auth Required", "Yes"), ("Encryption", "Yes"),
+    ("Encryption Type", "TLS/SSL"), ("Data Format", "JSON"), ("Frequency", "Batch"),
+    ("Data Integrity", "Hash"), ("Access Type", "Write"), ("Access Target", "Database"),
+    ("Network Protocol", "TCP/IP"), ("Communication Channel", "Wired"),
+    ("Credential Storage", "Secure Vault"), ("Interactor", "System"),
+    ("Threat", "Password Attack"),
+]
+
+
+def fake_scenarios(count):
+    return "\n\n".join(
+        "\n".join(f"{key}: {value}" for key, value in FIELDS) for _ in range(count)
+    )
+
+
+async def handle_completions(request):
+    app = request.app
+    body = await request.json()
+    await asyncio.sleep(app['latency'])
+    roll = random.random()
+    if roll < app['error_rate'] / 2:
+        return web.json_response({"error": {"message": "Rate limit reached"}}, status=429, headers={"retry-after": "0.1"})
+    if roll < app['error_rate']:
+        return web.json_response({"error": {"message": "Server error"}}, status=503)
+
+    prompt = body["messages"][-1]["content"]
+    match = re.search(r"Generate (\d+)", prompt)
+    count = int(match.group(1)) if match else 1
+    app['requests'] += 1
+    return web.json_response({
+        "id": f"chatcmpl-stub-{app['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": fake_scenarios(count)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    })
+
+
+def create_app(latency=0.5, error_rate=0.0):
+    app = web.Application()
+    app['latency'] = latency
+    app['error_rate'] = error_rate
+    app['requests'] = 0
+    app.router.add_post('/v1/chat/completions', handle_completions)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub chat completions server for local testing.")
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--latency', type=float, default=0.5, help="seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of 429/503 responses")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.error_rate), host='127.0.0.1', port=args.port)
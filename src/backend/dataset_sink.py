@@ -0,0 +1,173 @@
+import csv
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive inter-process lock on `path` (created if missing)."""
+    with open(path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 s; keep waiting
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def atomic_write(path, mode='wb', **kwargs):
+    """Write `path` via a per-writer temp file that replaces it only if the block succeeds.
+
+    Part files and the manifest are only ever seen complete.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _read_header(path):
+    """Return the CSV header of `path`, or None if the file is missing or empty."""
+    try:
+        with open(path, newline='', encoding='utf-8') as file:
+            first_line = file.readline()
+    except FileNotFoundError:
+        return None
+    if not first_line.strip():
+        return None
+    return next(csv.reader([first_line]))
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() == 0:
+            return True
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b'\n'
+
+
+class CsvSink:
+    """Appends rows to a CSV file without reading or rewriting what is already there.
+
+    The first append writes the header. Later appends reorder their columns
+    to match that header and leave missing ones empty; a frame with columns
+    the file does not have raises ValueError and nothing is written, since
+    appending it would silently lose those values. Appends take a lock
+    file, so several generator processes can share one CSV.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    def append(self, df):
+        if df.empty:
+            return 0
+        with file_lock(self.lock_path):
+            header = _read_header(self.path)
+            if header is None:
+                with open(self.path, 'w', newline='', encoding='utf-8') as file:
+                    df.to_csv(file, index=False)
+                return len(df)
+
+            extra = [column for column in df.columns if column not in header]
+            if extra:
+                raise ValueError(
+                    f"Columns {extra} are not in the header of {self.path}; "
+                    f"write them to a new file or migrate it first"
+                )
+            needs_newline = not _ends_with_newline(self.path)
+            with open(self.path, 'a', newline='', encoding='utf-8') as file:
+                if needs_newline:
+                    file.write('\n')
+                df.reindex(columns=header).to_csv(file, index=False, header=False)
+        return len(df)
+
+
+class ParquetSink:
+    """Appends each batch as a new Parquet part file in a dataset directory.
+
+    Parts are written under a temporary name and renamed into place. They
+    count as part of the dataset only once they are listed in
+    `_manifest.json`, which is rewritten atomically (temp file + replace)
+    under a lock. Readers therefore never see a partial part, and
+    concurrent writers never lose each other's entries. Needs pyarrow (or
+    fastparquet).
+    """
+
+    MANIFEST = '_manifest.json'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, self.MANIFEST)
+        self.lock_path = os.path.join(directory, '_manifest.lock')
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'version': 1, 'parts': []}
+
+    def append(self, df):
+        if df.empty:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}.parquet"
+        path = os.path.join(self.directory, name)
+        with atomic_write(path) as file:
+            df.to_parquet(file, index=False)
+
+        with file_lock(self.lock_path):
+            manifest = self._read_manifest()
+            manifest['parts'].append({
+                'file': name,
+                'rows': len(df),
+                'columns': [str(column) for column in df.columns],
+                'created': datetime.now(timezone.utc).isoformat(),
+            })
+            with atomic_write(self.manifest_path, 'w', encoding='utf-8') as file:
+                json.dump(manifest, file, indent=2)
+        return len(df)
+
+    def read(self):
+        """Load every committed part into one DataFrame."""
+        parts = self._read_manifest()['parts']
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(
+            [pd.read_parquet(os.path.join(self.directory, part['file'])) for part in parts],
+            ignore_index=True,
+        )
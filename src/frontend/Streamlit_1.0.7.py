@@ -1,197 +1,126 @@
 import streamlit as st
-import re
-import pandas as pd
-import pickle
-from plantuml import PlantUML
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.impute import SimpleImputer
-from fpdf import FPDF
-from io import BytesIO
-import base64
-import requests
-
-
-def render_plantuml(puml_content):
-    plantuml = PlantUML(url='http://www.plantuml.com/plantuml/img/')
-    diagram_url = plantuml.get_url(puml_content)
-    return diagram_url
-
-def display_plantuml(puml_content, caption):
-    diagram_url = render_plantuml(puml_content)
-    if diagram_url:
-        st.image(diagram_url, caption=caption)
+import os
+from puml_parser import parse_puml
+from puml_annotator import add_threats_to_puml
+from plantuml_render import RenderError, image_format, render_plantuml
+from report import generate_pdf
+from model_registry import load_model, registry
+from inference import analyze_dfd
+from recommendations import load_recommendations
+from tracing import serve_metrics_from_env, tracer
+from analysis_cache import AnalysisResult, analysis_cache
+
+MODEL_PATH = os.environ.get('THREAT_MODEL_PATH', 'c:\\Users\\David\\Desktop\\Streamlit\\RF_algorithm_general.pkl')
+RECOMMENDATIONS_PATH = os.environ.get('THREAT_RECOMMENDATIONS_PATH', 'C:\\Users\\David\\Desktop\\Streamlit\\Recommendations.csv')
+
+
+def render_diagram(puml_content, stage='render'):
+    try:
+        with tracer.span(stage) as span:
+            diagram_image = render_plantuml(puml_content)
+            span.set(bytes=len(diagram_image))
+    except RenderError:
+        return None
+    return diagram_image
+
+def display_plantuml(diagram_image, caption):
+    if diagram_image:
+        if image_format(diagram_image) == 'svg':
+            st.image(diagram_image.decode('utf-8'), caption=caption)
+        else:
+            st.image(diagram_image, caption=caption)
     else:
         st.error("Failed to render PlantUML diagram")
 
-def extract_containers(content):
-    container_pattern = re.compile(
-        r'(Container|ContainerDb|System_Ext|Person)\((\w+), "(.*?)", "(.*?)", "(.*?)\\nSourceType: (.*?)"\)',
-        re.DOTALL
-    )
-    containers = {}
-    matches = container_pattern.findall(content)
-    for match in matches:
-        container_type, var_name, name, description, _, source_type = match
-        containers[var_name.strip()] = source_type.strip()
-    return containers
-
-def parse_puml(content):
-    containers = extract_containers(content)
-    
-    pattern = re.compile(
-        r'Rel\((\w+)\s*,\s*(\w+)\s*,\s*"(.*?)"\s*,\s*"(.*?)"\)',
-        re.DOTALL
-    )
-    
-    matches = pattern.findall(content)
-    data = []
-    for match in matches:
-        source, target, relationship, details = match
-        source, target = source.strip(), target.strip()
-        
-        details_dict = {
-            'Source': source,
-            'Target': target,
-            'SourceType': containers.get(source),
-            'TargetType': containers.get(target),
-            'AuthRequired': re.search(r'AuthRequired:\s*(.*?)(,|$)', details).group(1) if re.search(r'AuthRequired:\s*(.*?)(,|$)', details) else None,
-            'Encryption': re.search(r'Encryption:\s*(.*?)(,|$)', details).group(1) if re.search(r'Encryption:\s*(.*?)(,|$)', details) else None,
-            'EncryptionType': re.search(r'EncryptionType:\s*(.*?)(,|$)', details).group(1) if re.search(r'EncryptionType:\s*(.*?)(,|$)', details) else None,
-            'DataFormat': re.search(r'DataFormat:\s*(.*?)(,|$)', details).group(1) if re.search(r'DataFormat:\s*(.*?)(,|$)', details) else None,
-            'Frequency': re.search(r'Frequency:\s*(.*?)(,|$)', details).group(1) if re.search(r'Frequency:\s*(.*?)(,|$)', details) else None,
-            'DataIntegrity': re.search(r'DataIntegrity:\s*(.*?)(,|$)', details).group(1) if re.search(r'DataIntegrity:\s*(.*?)(,|$)', details) else None,
-            'AccessType': re.search(r'AccessType:\s*(.*?)(,|$)', details).group(1) if re.search(r'AccessType:\s*(.*?)(,|$)', details) else None,
-            'AccessTarget': re.search(r'AccessTarget:\s*(.*?)(,|$)', details).group(1) if re.search(r'AccessTarget:\s*(.*?)(,|$)', details) else None,
-            'NetworkProtocol': re.search(r'NetworkProtocol:\s*(.*?)(,|$)', details).group(1) if re.search(r'NetworkProtocol:\s*(.*?)(,|$)', details) else None,
-            'CommunicationChannel': re.search(r'CommunicationChannel:\s*(.*?)(,|$)', details).group(1) if re.search(r'CommunicationChannel:\s*(.*?)(,|$)', details) else None,
-            'CredentialStorage': re.search(r'CredentialStorage:\s*(.*?)(,|$)', details).group(1) if re.search(r'CredentialStorage:\s*(.*?)(,|$)', details) else None,
-            'Interactor': re.search(r'Interactor:\s*(.*?)(,|$)', details).group(1) if re.search(r'Interactor:\s*(.*?)(,|$)', details) else None,
-            'Threat': re.search(r'Threat:\s*(.*?)(,|$)', details).group(1) if re.search(r'Threat:\s*(.*?)(,|$)', details) else None,
-        }
-        
-        data.append(details_dict)
-    
-    df = pd.DataFrame(data)
-    return df
-
-def load_model(pickle_file):
-    with open(pickle_file, 'rb') as file:
-        model, encoder = pickle.load(file)
-    return model, encoder
-
-def analyze_dfd(model, encoder, df):
-    training_columns = [
-        'SourceType', 'TargetType', 'AuthRequired', 'Encryption', 'EncryptionType', 
-        'DataFormat', 'Frequency', 'DataIntegrity', 'AccessType', 'AccessTarget', 
-        'NetworkProtocol', 'CommunicationChannel', 'CredentialStorage', 'Interactor'
-    ]
-
-    X_new = df[training_columns]
-
-    X_new_encoded = encoder.transform(X_new)
-
-    df_columns = encoder.get_feature_names_out()
-    X_new_encoded_df = pd.DataFrame(X_new_encoded.toarray(), columns=df_columns)
-
-    new_predictions = model.predict(X_new_encoded_df)
-
-    df['Predicted_Threat'] = new_predictions
-
-    return df
-
-def add_threats_to_puml(content, threats_df):
-    pattern = re.compile(
-        r'(Rel\((\w+),\s*(\w+),\s*"(.*?)",\s*"(.*?)"\))',
-        re.DOTALL
-    )
-
-    def replace_threat(match):
-        rel, source, target, relationship, details = match.groups()
-        source, target = source.strip(), target.strip()
-        threat_row = threats_df[(threats_df['Source'] == source) & (threats_df['Target'] == target)]
-        if not threat_row.empty:
-            threat = threat_row['Predicted_Threat'].values[0]
-            if threat and threat != "No Threat":
-                new_relationship = f'Rel({source}, {target},"<color:red>{threat}")'
-                return new_relationship
-        return f'Rel({source}, {target}, "{threat}")'
-
-    updated_content = pattern.sub(replace_threat, content)
-    return updated_content
-
-def get_recommendations(threats_df, recommendations_df):
-    recommendations = []
-    for threat in threats_df['Predicted_Threat'].unique():
-        if threat in recommendations_df['Threat'].values:
-            row = recommendations_df[recommendations_df['Threat'] == threat].iloc[0]
-            recommendations.append({
-                'Threat': threat,
-                'Explanation': row['Explanation'],
-                'Recommendation': row['Recommendation']
-            })
-    return recommendations
-
-def generate_pdf(updated_diagram_url, recommendations):
-    pdf = FPDF()
-    pdf.add_page()
-
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="DFD Analysis Report", ln=True, align='C')
-
-    updated_image_response = requests.get(updated_diagram_url)
-    updated_image_path = "updated_diagram.png"
-    with open(updated_image_path, "wb") as file:
-        file.write(updated_image_response.content)
-
-    pdf.cell(200, 10, txt="Annotated DFD with Predicted Threats:", ln=True, align='L')
-    pdf.image(updated_image_path, x=10, y=30, w=180)
-
-    pdf.add_page()
-    pdf.cell(200, 10, txt="Recommendations:", ln=True, align='L')
-    for rec in recommendations:
-        pdf.multi_cell(0, 10, txt=f"Threat: {rec['Threat']}\nRecommendation: {rec['Recommendation']}\nExplanation: {rec['Explanation']}\n", border=1)
-
-    pdf_output = pdf.output(dest='S').encode('latin1')
-
-    pdf_buffer = BytesIO(pdf_output)
-    pdf_buffer.seek(0)
-
-    return pdf_buffer
+def get_recommendations(threats_df, recommendations):
+    return recommendations.lookup(threats_df['Predicted_Threat'].unique())
 
 def colored_text(text, color):
     return f'<span style="color:{color};">{text}</span>'
 
+def show_trace(trace):
+    with st.sidebar.expander(f"Debug: {trace.seconds * 1000:.0f} ms in traced stages"):
+        st.table([
+            {
+                'stage': span.name,
+                'ms': round(span.seconds * 1000, 2),
+                'relationships': span.attributes.get('relationships'),
+                'bytes': span.attributes.get('bytes'),
+            }
+            for span in trace.spans
+        ])
+
 
 def main():
     st.title("PlantUML DFD Analyzer")
-    recommendations_path = "C:\\Users\\David\\Desktop\\Streamlit\\Recommendations.csv"
-    recommendations_df = pd.read_csv(recommendations_path)
+    # THREAT_TRACING=1 enables the spans below; otherwise they are no-ops
+    trace = tracer.start_trace()
+    serve_metrics_from_env()
+    # Indexed by threat; re-read only when the CSV changes
+    recommendations_index = load_recommendations(RECOMMENDATIONS_PATH)
+
+    # Loaded and warmed once per process, shared by every rerun and session
+    with tracer.span('load_model'):
+        model, encoder = load_model(MODEL_PATH)
+    for stats in registry.stats():
+        st.sidebar.caption(f"Model loaded in {stats['load_seconds']:.2f}s, warm-up {stats['warmup_seconds'] * 1000:.0f} ms, ~{stats['memory_bytes'] / 2**20:.0f} MiB")
+    cache_stats = analysis_cache.stats()
+    st.sidebar.caption(f"Result cache: {cache_stats['entries']} diagrams, ~{cache_stats['bytes'] / 2**20:.1f} MiB")
 
     if 'pdf_buffer' not in st.session_state:
         st.session_state.pdf_buffer = None
 
     uploaded_file = st.file_uploader("Choose a .puml file", type="puml")
     if uploaded_file is not None:
-        file_content = uploaded_file.getvalue().decode("utf-8")
-        
+        with tracer.span('read_upload') as span:
+            raw_content = uploaded_file.getvalue()
+            span.set(bytes=len(raw_content))
+            # Same diagram, model and recommendations give the same results,
+            # whichever rerun or session asks; only missing fields are computed
+            cache_key = analysis_cache.key(raw_content, model.version, recommendations_index.path, recommendations_index.mtime)
+            result = analysis_cache.get(cache_key)
+            if result is None:
+                result = AnalysisResult(raw_content.decode("utf-8"))
+        file_content = result.content
+
+        if result.original_image is None:
+            result.original_image = render_diagram(file_content, 'render_original')
         col1, col2 = st.columns(2)
         with col1:
-            display_plantuml(file_content, "Original DFD")
-
-        df = parse_puml(file_content)
+            display_plantuml(result.original_image, "Original DFD")
+
+        if result.df is None:
+            try:
+                with tracer.span('parse_puml') as span:
+                    result.df = parse_puml(file_content)
+                    span.set(relationships=len(result.df), bytes=len(file_content))
+            except ValueError as e:
+                st.error(f"Could not parse the uploaded PUML file: {e}")
+                return
+        df = result.df
         
         if not df.empty:
-            model, encoder = load_model('c:\\Users\\David\\Desktop\\Streamlit\\RF_algorithm_general.pkl')
-
             if st.button('Analyze DFD'):
-                threats_df = analyze_dfd(model, encoder, df)
-
-                updated_puml_content = add_threats_to_puml(file_content, threats_df)
-
+                if result.threats_df is None:
+                    with tracer.span('analyze_dfd', relationships=len(df)):
+                        # analyze_dfd adds a column; the cached parse stays as parsed
+                        result.threats_df = analyze_dfd(model, encoder, df.copy())
+                threats_df = result.threats_df
+
+                if result.annotated is None:
+                    with tracer.span('add_threats_to_puml', relationships=len(df)) as span:
+                        result.annotated = add_threats_to_puml(file_content, threats_df)
+                        span.set(bytes=len(result.annotated))
+
+                if result.annotated_image is None:
+                    result.annotated_image = render_diagram(result.annotated, 'render_annotated')
                 with col2:
-                    display_plantuml(updated_puml_content, "Annotated DFD with Predicted Threats")
+                    display_plantuml(result.annotated_image, "Annotated DFD with Predicted Threats")
 
-                recommendations = get_recommendations(threats_df, recommendations_df)
+                if result.recommendations is None:
+                    with tracer.span('get_recommendations'):
+                        result.recommendations = get_recommendations(threats_df, recommendations_index)
+                recommendations = result.recommendations
 
                 st.write("Recommendations:")
                 for rec in recommendations:
@@ -200,14 +129,20 @@ def main():
                     st.markdown(f'**Recommendation:** {rec["Recommendation"]}', unsafe_allow_html=True)
                     st.markdown("<hr>", unsafe_allow_html=True)
 
-                updated_diagram_url = render_plantuml(updated_puml_content)
-                pdf_buffer = generate_pdf(updated_diagram_url, recommendations)
-
-                st.session_state.pdf_buffer = pdf_buffer
+                # Reuses the bytes rendered above; the report is built in memory.
+                # Sessions get the immutable bytes, never a shared buffer
+                if result.pdf_bytes is None:
+                    with tracer.span('generate_pdf') as span:
+                        result.pdf_bytes = generate_pdf(result.annotated_image, recommendations).getvalue()
+                        span.set(bytes=len(result.pdf_bytes))
+                st.session_state.pdf_buffer = result.pdf_bytes
 
         else:
             st.warning("No relationships found in the uploaded PUML file.")
 
+        # Re-measured now that more of it may be filled in
+        analysis_cache.put(cache_key, result)
+
     if st.session_state.pdf_buffer is not None:
         st.download_button(
             label="Download PDF Report",
@@ -216,6 +151,9 @@ def main():
             mime="application/pdf"
         )
 
+    if trace is not None:
+        show_trace(trace)
+
 if __name__ == "__main__":
     main()
 
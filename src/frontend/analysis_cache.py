@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+from lru import BoundedLRU
+
+
+def _measure(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value) * 2
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    # Recommendations: a short list of small dicts
+    return 0
+
+
+class AnalysisResult:
+    """Everything computed for one uploaded diagram.
+
+    Fields start as None and are filled in as the user gets to them: the
+    parse and original render on upload, the rest on Analyze. Each field is
+    measured once, when it is first seen, so re-adding the result to the
+    cache on every rerun costs nothing for the fields already counted.
+    """
+
+    FIELDS = ('df', 'original_image', 'threats_df', 'annotated', 'annotated_image', 'recommendations', 'pdf_bytes')
+
+    def __init__(self, content):
+        self.content = content
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        self._measured = {}
+
+    @property
+    def nbytes(self):
+        total = len(self.content) * 2
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is None:
+                continue
+            measured = self._measured.get(field)
+            if measured is None or measured[0] is not value:
+                measured = self._measured[field] = (value, _measure(value))
+            total += measured[1]
+        return total
+
+
+class AnalysisCache:
+    """Process-wide LRU of AnalysisResults, bounded by their approximate size.
+
+    Keys hash the uploaded bytes together with the model and recommendation
+    versions, so a new model or CSV never serves stale predictions. Since
+    Streamlit keeps imported modules, every rerun and every session shares
+    it: re-uploading the same diagram reuses its parse, renders,
+    predictions and report.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = BoundedLRU(max_bytes)
+
+    @staticmethod
+    def key(content_bytes, *versions):
+        digest = hashlib.sha256(content_bytes)
+        for version in versions:
+            digest.update(b'\0')
+            digest.update(str(version).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, result):
+        """Add `result`, or re-weigh it after more of its fields were filled."""
+        self._entries.put(key, result, result.nbytes)
+
+    def stats(self):
+        stats = self._entries.stats()
+        return {'entries': stats['entries'], 'bytes': stats['weight'], 'hits': stats['hits'], 'misses': stats['misses']}
+
+
+analysis_cache = AnalysisCache(int(os.environ.get('THREAT_RESULT_CACHE_MB', '256')) * 1024 * 1024)
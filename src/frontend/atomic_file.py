@@ -0,0 +1,24 @@
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='wb', **kwargs):
+    """Open a temp file beside `path` and move it over `path` once the block succeeds.
+
+    Readers see the old file or the new one, never a partial write. The
+    temp name is unique per process and thread, so concurrent writers to
+    one path don't share it, and it is removed if the block fails.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
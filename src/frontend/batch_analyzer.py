@@ -0,0 +1,122 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from inference import analyze_dfd
+from model_registry import load_model
+from puml_annotator import add_threats_to_puml
+from puml_parser import parse_puml
+
+
+_model = None
+_encoder = None
+
+
+def _init_worker(model_path):
+    # Each worker process loads (and warms) the model exactly once
+    global _model, _encoder
+    _model, _encoder = load_model(model_path)
+
+
+def find_puml_files(inputs):
+    """Expand directories (recursively) and glob patterns into .puml paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, '**', '*.puml'), recursive=True)
+        else:
+            matches = glob.glob(item, recursive=True)
+        paths.extend(sorted(os.path.abspath(path) for path in matches if path.endswith('.puml')))
+    return list(dict.fromkeys(paths))
+
+
+def output_stem(path, input_root, output_dir):
+    relative = os.path.relpath(path, input_root)
+    return os.path.join(output_dir, os.path.splitext(relative)[0])
+
+
+def analyze_file(path, stem, result_format):
+    start = time.perf_counter()
+    with open(path, encoding='utf-8') as file:
+        content = file.read()
+
+    df = parse_puml(content)
+    os.makedirs(os.path.dirname(stem), exist_ok=True)
+    if not df.empty:
+        df = analyze_dfd(_model, _encoder, df)
+        with open(f"{stem}.annotated.puml", 'w', encoding='utf-8') as file:
+            file.write(add_threats_to_puml(content, df))
+
+    if result_format == 'csv':
+        df.to_csv(f"{stem}.csv", index=False)
+    else:
+        result = {
+            'file': path,
+            'relationships': len(df),
+            'threats': df.to_dict(orient='records'),
+        }
+        with open(f"{stem}.json", 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=2, default=str)
+
+    return path, len(df), time.perf_counter() - start
+
+
+def _analyze_task(task):
+    path, stem, result_format = task
+    try:
+        return analyze_file(path, stem, result_format) + (None,)
+    except Exception as e:
+        return path, 0, 0.0, f"{type(e).__name__}: {e}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Parse, analyze and annotate many .puml diagrams in parallel."
+    )
+    parser.add_argument('inputs', nargs='+', help="directories and/or glob patterns of .puml files")
+    parser.add_argument('-o', '--output', required=True, help="directory for the annotated diagrams and results")
+    parser.add_argument('-m', '--model', default=os.environ.get('THREAT_MODEL_PATH'),
+                        help="pickle of (model, encoder), defaults to $THREAT_MODEL_PATH")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json', help="result format per diagram")
+    args = parser.parse_args(argv)
+
+    if not args.model:
+        parser.error("no model given (use --model or set THREAT_MODEL_PATH)")
+
+    paths = find_puml_files(args.inputs)
+    if not paths:
+        print("No .puml files found.", file=sys.stderr)
+        return 1
+    input_root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    output_dir = os.path.abspath(args.output)
+    tasks = [(path, output_stem(path, input_root, output_dir), args.format) for path in paths]
+
+    start = time.perf_counter()
+    n_relationships = 0
+    failures = 0
+    workers = max(1, min(args.workers, len(tasks)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(args.model,)) as pool:
+        chunksize = max(1, len(tasks) // (workers * 8))
+        for path, count, seconds, error in pool.map(_analyze_task, tasks, chunksize=chunksize):
+            if error:
+                failures += 1
+                print(f"FAILED {path}: {error}", file=sys.stderr)
+            else:
+                n_relationships += count
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{len(tasks) - failures}/{len(tasks)} diagrams, {n_relationships} relationships "
+        f"in {elapsed:.2f}s with {workers} workers "
+        f"({len(tasks) / elapsed:.1f} diagrams/s, {n_relationships / elapsed:.0f} relationships/s)"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from inference import analyze_dfd, prediction_cache
+from model_registry import TRAINING_COLUMNS, load_model
+from plantuml_render import RenderCache
+from puml_annotator import add_threats_to_puml
+from puml_parser import extract_containers, parse_puml
+from recommendations import RecommendationIndex
+from report import generate_pdf
+
+# Values as they appear in tests/test_puml_files/testpuml2.puml
+TYPES = ['Database', 'Device', 'Service', 'Software/Program', 'System/Server', 'User', 'Web Application']
+DETAIL_VALUES = {
+    'AuthRequired': ['Yes', 'No'],
+    'Encryption': ['Yes', 'No'],
+    'EncryptionType': ['AES', 'Asymmetric', 'Hashing', 'No Encryption', 'Symmetric', 'TLS/SSL'],
+    'DataFormat': ['Binary', 'CSV', 'HTML', 'JSON', 'No Format', 'Plain Text', 'XML', 'YAML'],
+    'Frequency': ['Batch', 'Event-Driven', 'On-Demand', 'Periodic', 'Real-Time'],
+    'DataIntegrity': ['Checksum', 'Digital Signature', 'Hash', 'No Data Integrity'],
+    'AccessType': ['Execute', 'No Access Type', 'Read', 'Read&Write', 'Write'],
+    'AccessTarget': ['Database', 'Device', 'File System', 'In-Memory Cache', 'Message Queue', 'No Target',
+                     'User Interface', 'Web Service/API'],
+    'NetworkProtocol': ['FTP/SFTP', 'HTTP/HTTPS', 'MQTT', 'No Network Protocol', 'SMTP', 'TCP/IP', 'UDP', 'WebSockets'],
+    'CommunicationChannel': ['Bluetooth', 'NFC', 'No Communication Channel', 'Virtual Private Network',
+                             'WebSockets', 'Wired', 'Wireless'],
+    'CredentialStorage': ['Configuration File', 'Encrypted', 'Environment Variable', 'Hashed',
+                          'No Credential Storage', 'Plain Text', 'Secure Vault'],
+    'Interactor': ['Application', 'Device', 'Service', 'System', 'Third-Party API', 'User'],
+}
+THREATS = [
+    'API Security Breach', 'Credential Stuffing', 'Cross-Site Request Forgery (CSRF)', 'Cross-Site Scripting (XSS)',
+    'Denial of Service (DoS)', 'Directory Traversal', 'Malware Attack', 'Man-in-the-Middle (MitM) Attack',
+    'No Threat', 'Password Attack', 'Phishing Attacks', 'Remote Code Execution (RCE)', 'SQL Injection',
+]
+STAGES = ['extract_containers', 'parse_puml', 'analyze_dfd', 'add_threats_to_puml', 'render', 'get_recommendations',
+          'generate_pdf']
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+# 1x1 transparent PNG returned by the stub renderer
+STUB_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c63000100000500010d0a2db40000000049454e44ae426082'
+)
+
+
+class StubRenderer:
+    """Stands in for the PlantUML server/jar so render cost is only our side."""
+
+    format = 'png'
+
+    def render(self, puml_content):
+        return STUB_PNG
+
+
+def synthetic_diagram(n_relationships, seed=0):
+    """A C4 diagram with `n_relationships` Rel() calls in the testpuml2.puml syntax."""
+    rng = random.Random(seed)
+    n_containers = max(4, n_relationships // 4)
+    names = [f"component_{i}" for i in range(n_containers)]
+    types = [rng.choice(TYPES) for _ in names]
+
+    lines = [
+        '@startuml C4_Elements',
+        '!include https://raw.githubusercontent.com/plantuml-stdlib/C4-PlantUML/master/C4_Container.puml',
+        '',
+        'title Synthetic Benchmark DFD',
+        '',
+        'System_Boundary(platform, "Enterprise Platform") {',
+    ]
+    n_internal = n_containers * 3 // 4
+    for i in range(n_internal):
+        macro = 'ContainerDb' if types[i] == 'Database' else 'Container'
+        lines.append(
+            f'    {macro}({names[i]}, "Component {i}", "{types[i]}", '
+            f'"Service\\nGenerated component\\nSourceType: {types[i]}")'
+        )
+    lines.append('}')
+    lines.append('')
+    for i in range(n_internal, n_containers):
+        lines.append(f'System_Ext({names[i]}, "External {i}", "{types[i]}\\nSourceType: {types[i]}")')
+    lines.append('')
+    for i in range(n_relationships):
+        source, target = rng.sample(range(n_containers), 2)
+        details = ''.join(f"{field}: {rng.choice(values)}, " for field, values in DETAIL_VALUES.items())
+        lines.append(f'Rel({names[source]}, {names[target]}, "Flow {i}", "{details}")')
+    lines.append('@enduml')
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_model_path(directory, n_estimators=100, seed=0):
+    """Fit a forest of the production shape on random rows and pickle it as (model, encoder)."""
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import OneHotEncoder
+
+    rng = random.Random(seed)
+    values = {'SourceType': TYPES, 'TargetType': TYPES, **DETAIL_VALUES}
+    rows = [[rng.choice(values[column]) for column in TRAINING_COLUMNS] for _ in range(5000)]
+    X = pd.DataFrame(rows, columns=TRAINING_COLUMNS)
+    y = [rng.choice(THREATS) for _ in rows]
+    encoder = OneHotEncoder(handle_unknown='ignore').fit(X)
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=seed).fit(encoder.transform(X), y)
+    path = os.path.join(directory, 'benchmark_model.pkl')
+    with open(path, 'wb') as file:
+        pickle.dump((model, encoder), file)
+    return path
+
+
+def synthetic_recommendations():
+    by_threat = {
+        threat: {'Threat': threat, 'Explanation': f"Why {threat} matters.", 'Recommendation': f"How to mitigate {threat}."}
+        for threat in THREATS
+    }
+    return RecommendationIndex('<synthetic>', 0.0, by_threat)
+
+
+def run_pipeline(content, model, encoder, recommendations):
+    """One pass through every stage; returns {stage: seconds} and the relationship count."""
+    timings = {}
+
+    start = time.perf_counter()
+    extract_containers(content)
+    timings['extract_containers'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = parse_puml(content)
+    timings['parse_puml'] = time.perf_counter() - start
+
+    # Measure real predictions, not prediction-cache hits from the previous run
+    prediction_cache.clear()
+    start = time.perf_counter()
+    df = analyze_dfd(model, encoder, df)
+    timings['analyze_dfd'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    annotated = add_threats_to_puml(content, df)
+    timings['add_threats_to_puml'] = time.perf_counter() - start
+
+    renderer = RenderCache(StubRenderer())
+    start = time.perf_counter()
+    image = renderer.render(annotated)
+    timings['render'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recs = recommendations.lookup(df['Predicted_Threat'].unique())
+    timings['get_recommendations'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    generate_pdf(image, recs)
+    timings['generate_pdf'] = time.perf_counter() - start
+
+    return timings, len(df)
+
+
+def peak_memory(content, model, encoder, recommendations):
+    """Peak traced allocation per stage, from one separate (slower) pass."""
+    peaks = {}
+
+    def traced(stage, fn):
+        tracemalloc.start()
+        try:
+            result = fn()
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return result
+
+    traced('extract_containers', lambda: extract_containers(content))
+    df = traced('parse_puml', lambda: parse_puml(content))
+    prediction_cache.clear()
+    df = traced('analyze_dfd', lambda: analyze_dfd(model, encoder, df))
+    annotated = traced('add_threats_to_puml', lambda: add_threats_to_puml(content, df))
+    image = traced('render', lambda: RenderCache(StubRenderer()).render(annotated))
+    recs = traced('get_recommendations', lambda: recommendations.lookup(df['Predicted_Threat'].unique()))
+    traced('generate_pdf', lambda: generate_pdf(image, recs))
+    return peaks
+
+
+def default_repeats(n_relationships):
+    return max(3, min(100, 20000 // n_relationships))
+
+
+def benchmark(sizes, model, encoder, recommendations, repeats=None, seed=0, verbose=True):
+    results = {}
+    for size in sizes:
+        content = synthetic_diagram(size, seed)
+        runs = repeats or default_repeats(size)
+        run_pipeline(content, model, encoder, recommendations)  # warm-up
+        samples = {stage: [] for stage in STAGES}
+        for _ in range(runs):
+            timings, n_relationships = run_pipeline(content, model, encoder, recommendations)
+            for stage, seconds in timings.items():
+                samples[stage].append(seconds)
+        peaks = peak_memory(content, model, encoder, recommendations)
+
+        stages = {}
+        for stage in STAGES:
+            seconds = np.array(samples[stage])
+            p50 = float(np.percentile(seconds, 50))
+            stages[stage] = {
+                'p50_ms': p50 * 1000,
+                'p99_ms': float(np.percentile(seconds, 99)) * 1000,
+                'mean_ms': float(seconds.mean()) * 1000,
+                'relationships_per_s': n_relationships / p50 if p50 > 0 else None,
+                'peak_bytes': peaks[stage],
+            }
+        total = sum(stage['p50_ms'] for stage in stages.values())
+        results[str(size)] = {
+            'relationships': n_relationships,
+            'bytes': len(content.encode('utf-8')),
+            'runs': runs,
+            'total_p50_ms': total,
+            'stages': stages,
+        }
+        if verbose:
+            print_size(size, results[str(size)])
+    return results
+
+
+def print_size(size, result):
+    print(f"\n{size} relationships ({result['bytes'] / 1e6:.2f} MB, {result['runs']} runs), "
+          f"total p50 {result['total_p50_ms']:.1f} ms")
+    print(f"  {'stage':<22}{'p50 ms':>10}{'p99 ms':>10}{'rel/s':>12}{'peak MiB':>10}")
+    for stage, stats in result['stages'].items():
+        rate = stats['relationships_per_s']
+        print(
+            f"  {stage:<22}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+            f"{(f'{rate:,.0f}' if rate else '-'):>12}{stats['peak_bytes'] / 2**20:>10.2f}"
+        )
+
+
+def compare(baseline, current, threshold, min_delta_ms=1.0):
+    """Print p50 ratios against a baseline; return the (size, stage) pairs slower than 1 + threshold.
+
+    Differences under `min_delta_ms` are treated as noise, whatever the ratio.
+    """
+    regressions = []
+    print(f"\nComparison with baseline from {baseline['meta']['created']} (threshold +{threshold:.0%}):")
+    for size, result in current['results'].items():
+        before = baseline['results'].get(size)
+        if before is None:
+            continue
+        for stage, stats in result['stages'].items():
+            old = before['stages'].get(stage)
+            if not old or not old['p50_ms']:
+                continue
+            ratio = stats['p50_ms'] / old['p50_ms']
+            flag = ''
+            significant = abs(stats['p50_ms'] - old['p50_ms']) >= min_delta_ms
+            if significant and ratio > 1 + threshold:
+                flag = '  REGRESSION'
+                regressions.append((size, stage))
+            elif significant and ratio < 1 - threshold:
+                flag = '  faster'
+            print(f"  {size:>7} {stage:<22}{old['p50_ms']:>10.2f} -> {stats['p50_ms']:>10.2f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark parse -> predict -> annotate -> render -> report on synthetic C4 diagrams."
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="relationships per diagram")
+    parser.add_argument('--repeat', type=int, help="runs per size (default: more for small diagrams)")
+    parser.add_argument('-m', '--model', default=os.environ.get('THREAT_MODEL_PATH'),
+                        help="(model, encoder) pickle; a synthetic 100-tree forest is used if not given")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="p50 slowdown counted as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="ignore p50 differences smaller than this")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = args.model or synthetic_model_path(directory, seed=args.seed)
+        model, encoder = load_model(model_path)
+        results = benchmark(args.sizes, model, encoder, synthetic_recommendations(), args.repeat, args.seed)
+
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'model': args.model or 'synthetic',
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare(baseline, report, args.threshold, args.min_delta_ms):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import json
+import mmap
+
+import numpy as np
+
+from atomic_file import atomic_write
+from forest_compiler import CompiledForest
+from vocab_encoder import VocabularyEncoder, is_missing
+
+MAGIC = b'TMFOREST'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+ARRAYS = ('roots', 'feature', 'threshold', 'children', 'leaf_proba')
+
+
+def _index_dtype(*arrays):
+    largest = max((int(np.abs(array).max()) for array in arrays if array.size), default=0)
+    return np.dtype('<i4') if largest < 2**31 - 1 else np.dtype('<i8')
+
+
+def save_compact(compiled, vocabulary, path, metadata=None):
+    """Write a compiled forest and its vocabulary as header + aligned raw arrays.
+
+    Layout: MAGIC, the header length as a little-endian uint64, the JSON
+    header, then every array at a 64-byte aligned offset, little-endian and
+    C-ordered. The header holds the vocabularies, the classes and each
+    array's dtype/shape/offset; there is no pickle anywhere, so the file
+    loads in any Python version and is safe to read from untrusted sources.
+    """
+    index_dtype = _index_dtype(compiled.roots, compiled.feature, compiled.children)
+    arrays = {
+        'roots': compiled.roots.astype(index_dtype),
+        'feature': compiled.feature.astype(index_dtype),
+        'threshold': compiled.threshold.astype('<f8'),
+        'children': compiled.children.astype(index_dtype),
+        'leaf_proba': compiled.leaf_proba.astype('<f8'),
+    }
+    header = {
+        'format_version': FORMAT_VERSION,
+        'n_features': int(compiled.n_features_in_),
+        'classes': [str(label) for label in compiled.classes_.tolist()],
+        'columns': list(vocabulary.columns),
+        'categories': [
+            [None if is_missing(value) else value for value in values.tolist()]
+            for values in vocabulary.categories_
+        ],
+        'handle_unknown': vocabulary.handle_unknown,
+        'encoder_dtype': np.dtype(vocabulary.dtype).name,
+        'metadata': metadata or {},
+        'arrays': {},
+    }
+
+    # Offsets depend on the header length, which depends on the offsets;
+    # they are relative to the data section to break the cycle
+    offset = 0
+    for name in ARRAYS:
+        array = arrays[name]
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+
+    with atomic_write(path) as file:
+        file.write(MAGIC)
+        file.write(np.uint64(len(encoded)).astype('<u8').tobytes())
+        file.write(encoded)
+        for name in ARRAYS:
+            file.seek(data_start + header['arrays'][name]['offset'])
+            file.write(np.ascontiguousarray(arrays[name]).tobytes())
+
+
+def is_compact(path):
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def _read_header(file, path):
+    """Return the header and the offset where the array data starts."""
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a compact model file")
+    length = int(np.frombuffer(file.read(8), dtype='<u8')[0])
+    header = json.loads(file.read(length).decode('utf-8'))
+    return header, -(-(len(MAGIC) + 8 + length) // ALIGNMENT) * ALIGNMENT
+
+
+def _check_structure(forest):
+    """Reject files whose node arrays could index out of bounds or loop.
+
+    Split nodes are numbered depth first, so every child reference is
+    either a leaf or a later split node; traversal therefore always ends.
+    """
+    n_nodes = len(forest.feature)
+    n_leaves = len(forest.leaf_proba)
+    children = forest.children
+    if len(children) != 2 * n_nodes or len(forest.threshold) != n_nodes:
+        raise ValueError("Inconsistent node array lengths")
+    if forest.leaf_proba.ndim != 2 or forest.leaf_proba.shape[1] != len(forest.classes_):
+        raise ValueError("Leaf distributions do not match the classes")
+    if n_nodes and not ((forest.feature >= 0) & (forest.feature < forest.n_features_in_)).all():
+        raise ValueError("Split feature out of range")
+    references = np.concatenate([forest.roots, children])
+    leaves = ~references[references < 0]
+    if leaves.size and leaves.max() >= n_leaves:
+        raise ValueError("Leaf reference out of range")
+    splits = references >= 0
+    if splits.any() and references[splits].max() >= n_nodes:
+        raise ValueError("Node reference out of range")
+    parent = np.arange(len(children)) // 2
+    if not ((children < 0) | (children > parent)).all():
+        raise ValueError("Child references must point forward")
+
+
+def load_compact(path):
+    """Return (CompiledForest, VocabularyEncoder) backed by a read-only mmap of `path`.
+
+    The arrays are views into the mapping, so loading copies nothing and
+    processes that load the same file share its pages.
+    """
+    with open(path, 'rb') as file:
+        header, data_start = _read_header(file, path)
+        if header.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact model version {header.get('format_version')}")
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    arrays = {}
+    for name in ARRAYS:
+        spec = header['arrays'][name]
+        dtype = np.dtype(spec['dtype'])
+        shape = tuple(spec['shape'])
+        count = int(np.prod(shape))
+        start = data_start + spec['offset']
+        if start + count * dtype.itemsize > len(mapping):
+            raise ValueError(f"Array {name} extends past the end of {path}")
+        arrays[name] = np.frombuffer(mapping, dtype=dtype, count=count, offset=start).reshape(shape)
+
+    forest = CompiledForest(
+        classes=np.array(header['classes'], dtype=object),
+        n_features=header['n_features'],
+        **arrays,
+    )
+    _check_structure(forest)
+    categories = [
+        np.array([np.nan if value is None else value for value in values], dtype=object)
+        for values in header['categories']
+    ]
+    vocabulary = VocabularyEncoder(
+        header['columns'], categories, handle_unknown=header['handle_unknown'],
+        dtype=np.dtype(header['encoder_dtype']).type,
+    )
+    if vocabulary.n_features_out != forest.n_features_in_:
+        raise ValueError(
+            f"Model expects {forest.n_features_in_} features, encoder produces {vocabulary.n_features_out}"
+        )
+    return forest, vocabulary
@@ -0,0 +1,194 @@
+import argparse
+import os
+import pickle
+import sys
+
+import numpy as np
+
+
+BATCH_SIZE = 4096
+
+
+class CompiledForest:
+    """A trained tree ensemble flattened into contiguous NumPy arrays.
+
+    The split nodes of all trees share one table (`feature`, `threshold`
+    and `children`, which holds the left/right pair of node i at 2i/2i+1).
+    A child reference >= 0 is another split node, a negative one is ~leaf,
+    an index into `leaf_proba`. Each leaf keeps its normalised class
+    distribution and predictions average them over the trees exactly like
+    RandomForestClassifier.predict_proba, so the labels match model.predict.
+    """
+
+    def __init__(self, classes, n_features, roots, feature, threshold, children, leaf_proba):
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_proba = leaf_proba
+        # One-hot inputs are 0/1, so a split at t in [0, 1) just tests the bit
+        self.binary_splits = bool(((threshold >= 0) & (threshold < 1)).all())
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        arrays = (self.roots, self.feature, self.threshold, self.children, self.leaf_proba)
+        return sum(array.nbytes for array in arrays)
+
+    def _as_dense(self, X):
+        if hasattr(X, 'toarray'):
+            binary = self.binary_splits and bool((X.data == 1).all())
+            X = X.toarray()
+        else:
+            X = np.asarray(X)
+            binary = self.binary_splits and bool(((X == 0) | (X == 1)).all())
+        if binary:
+            return X.astype(np.intp), True
+        # sklearn compares float32 inputs against float64 thresholds
+        return X.astype(np.float32), False
+
+    def apply_leaves(self, X):
+        """Return the leaf index reached in every tree, shape (n_trees, n_samples)."""
+        X, binary = self._as_dense(X)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        leaves = np.empty(self.n_trees * n_samples, dtype=np.intp)
+
+        # Tree-major order keeps each step's lookups inside one tree's nodes.
+        # Paths that reached a leaf are dropped, so the work is the total
+        # path length rather than n_trees * max_depth per row.
+        position = np.arange(self.n_trees * n_samples)
+        node = np.repeat(self.roots, n_samples)
+        row_offset = np.tile(np.arange(n_samples, dtype=np.intp) * n_features, self.n_trees)
+        while True:
+            done = node < 0
+            if done.any():
+                leaves[position[done]] = ~node[done]
+                keep = ~done
+                position, node, row_offset = position[keep], node[keep], row_offset[keep]
+                if not position.size:
+                    break
+            values = flat_X[row_offset + self.feature[node]]
+            if binary:
+                go_right = values
+            else:
+                go_right = values > self.threshold[node]
+            node = self.children[2 * node + go_right]
+        return leaves.reshape(self.n_trees, n_samples)
+
+    def predict_proba(self, X):
+        n_samples = X.shape[0]
+        proba = np.zeros((n_samples, len(self.classes_)), dtype=np.float64)
+        for start in range(0, n_samples, BATCH_SIZE):
+            leaves = self.apply_leaves(X[start:start + BATCH_SIZE])
+            batch = proba[start:start + BATCH_SIZE]
+            # Accumulate tree by tree, in order, like the sklearn forest does
+            for tree_leaves in leaves:
+                batch += self.leaf_proba[tree_leaves]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def compile_forest(model):
+    """Flatten a fitted RandomForestClassifier (or DecisionTreeClassifier)."""
+    estimators = getattr(model, 'estimators_', [model])
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("Only single-output classifiers can be compiled")
+
+    roots, features, thresholds, children, probas = [], [], [], [], []
+    node_offset = 0
+    leaf_offset = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        split_nodes = np.flatnonzero(~is_leaf)
+
+        # Renumber: split nodes count up from node_offset, leaves become ~slot
+        reference = np.where(
+            is_leaf,
+            ~(np.cumsum(is_leaf) - 1 + leaf_offset),
+            np.cumsum(~is_leaf) - 1 + node_offset,
+        )
+        pairs = np.empty(2 * len(split_nodes), dtype=np.intp)
+        pairs[0::2] = reference[tree.children_left[split_nodes]]
+        pairs[1::2] = reference[tree.children_right[split_nodes]]
+
+        value = tree.value[is_leaf, 0, :].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+
+        roots.append(reference[0])
+        features.append(tree.feature[split_nodes])
+        thresholds.append(tree.threshold[split_nodes])
+        children.append(pairs)
+        probas.append(value / normalizer)
+        node_offset += len(split_nodes)
+        leaf_offset += int(is_leaf.sum())
+
+    return CompiledForest(
+        classes=np.asarray(model.classes_),
+        n_features=model.n_features_in_,
+        roots=np.asarray(roots, dtype=np.intp),
+        feature=np.concatenate(features).astype(np.intp),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        children=np.concatenate(children),
+        leaf_proba=np.concatenate(probas),
+    )
+
+
+def check_equivalence(model, compiled, X):
+    """Return the indices of rows where the compiled forest disagrees with the model."""
+    expected = model.predict(X)
+    actual = compiled.predict(X)
+    return np.flatnonzero(expected != actual)
+
+
+def main(argv=None):
+    import pandas as pd
+
+    import sklearn
+
+    from compact_model import save_compact
+    from model_registry import TRAINING_COLUMNS, check_feature_alignment
+    from vocab_encoder import VocabularyEncoder
+
+    parser = argparse.ArgumentParser(
+        description="Check that the compiled forest predicts the same labels as the pickled model."
+    )
+    parser.add_argument('model', help="pickle of (model, encoder)")
+    parser.add_argument('datasets', nargs='+', help=".xlsx/.csv files with the training columns")
+    parser.add_argument('--export', metavar='PATH',
+                        help="if every dataset matches, write the compact (pickle-free, mmap-able) model here")
+    args = parser.parse_args(argv)
+
+    with open(args.model, 'rb') as file:
+        model, encoder = pickle.load(file)
+    check_feature_alignment(model, encoder)
+    compiled = compile_forest(model)
+
+    failed = False
+    for path in args.datasets:
+        data = pd.read_excel(path) if path.endswith('.xlsx') else pd.read_csv(path)
+        X = encoder.transform(data[TRAINING_COLUMNS])
+        mismatches = check_equivalence(model, compiled, X)
+        print(f"{path}: {X.shape[0]} rows, {len(mismatches)} mismatches")
+        failed = failed or len(mismatches) > 0
+    if failed:
+        return 1
+    if args.export:
+        metadata = {'source': os.path.basename(args.model), 'sklearn_version': sklearn.__version__}
+        save_compact(compiled, VocabularyEncoder.from_onehot(encoder), args.export, metadata)
+        print(f"Wrote {args.export}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
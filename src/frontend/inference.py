@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from lru import BoundedLRU
+from model_registry import TRAINING_COLUMNS
+
+
+class PredictionCache:
+    """Bounded LRU of predicted labels keyed by (model version, feature tuple)."""
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._entries = BoundedLRU(maxsize)
+
+    @property
+    def hits(self):
+        return self._entries.hits
+
+    @property
+    def misses(self):
+        return self._entries.misses
+
+    def get_many(self, version, keys):
+        """Return cached labels for `keys`, None where there is no entry."""
+        return self._entries.get_many([(version, key) for key in keys])
+
+    def put_many(self, version, keys, labels):
+        self._entries.put_many(((version, key), label) for key, label in zip(keys, labels))
+
+    def clear(self):
+        self._entries.clear()
+
+
+prediction_cache = PredictionCache()
+
+
+def feature_rows(df):
+    """Return the TRAINING_COLUMNS of `df` as a list of row tuples."""
+    return list(zip(*(df[column].tolist() for column in TRAINING_COLUMNS)))
+
+
+def predict_rows(model, encoder, rows, cache=prediction_cache):
+    """Predict one threat per feature tuple (ordered like TRAINING_COLUMNS).
+
+    Identical feature tuples are predicted once and scattered back, and
+    labels are remembered across calls for models that carry a `version`
+    (the registry's LoadedModel), so the cost follows the number of
+    distinct rows not yet seen rather than the size of the diagram.
+    """
+    slots = {}
+    inverse = np.fromiter((slots.setdefault(row, len(slots)) for row in rows), dtype=np.intp, count=len(rows))
+    unique_rows = list(slots)
+
+    version = getattr(model, 'version', None)
+    if version is not None and cache is not None:
+        labels = cache.get_many(version, unique_rows)
+    else:
+        labels = [None] * len(unique_rows)
+
+    missing = [i for i, label in enumerate(labels) if label is None]
+    if missing:
+        missing_rows = [unique_rows[i] for i in missing]
+        if hasattr(encoder, 'transform_rows'):
+            X_encoded = encoder.transform_rows(missing_rows)
+        else:
+            X_encoded = encoder.transform(pd.DataFrame(missing_rows, columns=TRAINING_COLUMNS))
+        predicted = model.predict(X_encoded)
+        for i, label in zip(missing, predicted):
+            labels[i] = label
+        if version is not None and cache is not None:
+            cache.put_many(version, missing_rows, predicted)
+
+    return np.asarray(labels, dtype=object)[inverse]
+
+
+def predict_threats(model, encoder, X, cache=prediction_cache):
+    """Predict one threat per row of `X` (the TRAINING_COLUMNS frame)."""
+    return predict_rows(model, encoder, feature_rows(X), cache=cache)
+
+
+def analyze_dfd(model, encoder, df):
+    X_new = df[TRAINING_COLUMNS]
+
+    # Repeated feature tuples are encoded and predicted once; the encoder's
+    # CSR output goes straight to the model (columns checked at load time)
+    new_predictions = predict_threats(model, encoder, X_new)
+
+    df['Predicted_Threat'] = new_predictions
+
+    return df
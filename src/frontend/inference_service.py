@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+
+from aiohttp import web
+
+from inference import feature_rows, predict_rows, prediction_cache
+from model_registry import load_model, registry
+from puml_annotator import add_threats_to_puml
+from puml_parser import parse_puml
+from tracing import tracer
+
+
+class MicroBatcher:
+    """Gathers prediction requests from concurrent HTTP calls into one predict.
+
+    The first request of a batch waits at most `max_wait` seconds for others
+    to join, or until `max_batch_size` rows are queued. The whole batch then
+    runs as a single vectorised predict in a worker thread while the next
+    batch is being gathered.
+
+    Each batch asks the registry for `model_path`, so a model replaced on
+    disk (e.g. promoted by update.py) is picked up without a restart.
+    """
+
+    def __init__(self, model_path, max_batch_size=512, max_wait=0.005):
+        self.model_path = model_path
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, rows):
+        if not rows:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        return await future
+
+    async def _gather(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _predict(self, rows):
+        # In the worker thread: a reload after a model change must not block the loop
+        loaded = registry.get(self.model_path)
+        return predict_rows(loaded, loaded.vocabulary, rows)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._gather()
+            rows = [row for request_rows, _ in batch for row in request_rows]
+            try:
+                labels = await loop.run_in_executor(None, self._predict, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(rows)
+
+            pos = 0
+            for request_rows, future in batch:
+                if not future.done():
+                    future.set_result(labels[pos:pos + len(request_rows)].tolist())
+                pos += len(request_rows)
+
+
+BATCHER = web.AppKey('batcher', MicroBatcher)
+
+
+async def run_batcher(app):
+    # The batcher's task needs the running loop, so it starts with the app
+    app[BATCHER].start()
+    yield
+    await app[BATCHER].stop()
+
+
+json_response = functools.partial(web.json_response, dumps=functools.partial(json.dumps, default=str))
+
+
+def _parse(content):
+    with tracer.span('parse_puml') as span:
+        df = parse_puml(content)
+        span.set(relationships=len(df), bytes=len(content))
+    return df
+
+
+def _annotate(content, df):
+    with tracer.span('add_threats_to_puml', relationships=len(df)) as span:
+        annotated = add_threats_to_puml(content, df) if not df.empty else content
+        span.set(bytes=len(annotated))
+    return annotated
+
+
+async def _in_executor(function, *args):
+    # Parsing and annotating large uploads would otherwise stall every other request
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+async def _read_text(request):
+    try:
+        return await request.text()
+    except UnicodeDecodeError as e:
+        raise web.HTTPBadRequest(text=f"Request body is not valid {request.charset or 'utf-8'}: {e}")
+
+
+async def _parsed_frame(request):
+    content = await _read_text(request)
+    try:
+        return content, await _in_executor(_parse, content)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=f"Could not parse the PUML document: {e}")
+
+
+async def _analyzed_frame(request):
+    content, df = await _parsed_frame(request)
+    if not df.empty:
+        with tracer.span('analyze_dfd', relationships=len(df)):
+            df['Predicted_Threat'] = await request.app[BATCHER].predict(feature_rows(df))
+    return content, df
+
+
+async def handle_parse(request):
+    _, df = await _parsed_frame(request)
+    return json_response({'relationships': len(df), 'records': df.to_dict(orient='records')})
+
+
+async def handle_analyze(request):
+    _, df = await _analyzed_frame(request)
+    return json_response({'relationships': len(df), 'threats': df.to_dict(orient='records')})
+
+
+async def handle_annotate(request):
+    content, df = await _analyzed_frame(request)
+    annotated = await _in_executor(_annotate, content, df)
+    return web.Response(text=annotated, content_type='text/plain')
+
+
+async def handle_stats(request):
+    batcher = request.app[BATCHER]
+    return json_response({
+        'batches': batcher.batches,
+        'rows': batcher.rows,
+        'cache_hits': prediction_cache.hits,
+        'cache_misses': prediction_cache.misses,
+        'models': registry.stats(),
+    })
+
+
+async def handle_metrics(request):
+    # Prometheus text format; empty unless THREAT_TRACING is set
+    return web.Response(text=tracer.metrics.render(), content_type='text/plain')
+
+
+def create_app(model_path, max_batch_size=512, max_wait=0.005):
+    """Build the aiohttp app: POST a PUML document to /parse, /analyze or /annotate."""
+    # Load once up front so a bad artifact fails at startup, not on the first request
+    load_model(model_path)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app[BATCHER] = MicroBatcher(model_path, max_batch_size=max_batch_size, max_wait=max_wait)
+    app.cleanup_ctx.append(run_batcher)
+    app.router.add_post('/parse', handle_parse)
+    app.router.add_post('/analyze', handle_analyze)
+    app.router.add_post('/annotate', handle_annotate)
+    app.router.add_get('/stats', handle_stats)
+    app.router.add_get('/metrics', handle_metrics)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service for parsing, analyzing and annotating PUML diagrams.")
+    parser.add_argument('-m', '--model', default=os.environ.get('THREAT_MODEL_PATH'),
+                        help="pickle of (model, encoder), defaults to $THREAT_MODEL_PATH")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8500)
+    parser.add_argument('--max-batch-size', type=int, default=512, help="rows per predict call")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="how long a batch waits for more requests")
+    args = parser.parse_args(argv)
+
+    if not args.model:
+        parser.error("no model given (use --model or set THREAT_MODEL_PATH)")
+
+    app = create_app(args.model, max_batch_size=args.max_batch_size, max_wait=args.max_wait_ms / 1000)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+
+class BoundedLRU:
+    """Thread-safe LRU mapping bounded by the total weight of its entries.
+
+    Each entry weighs 1 unless `put` is given a weight (e.g. its size in
+    bytes). Entries heavier than `max_weight` are not kept; otherwise the
+    least recently used entries are evicted until the total fits again.
+    """
+
+    def __init__(self, max_weight):
+        self.max_weight = max_weight
+        self.hits = 0
+        self.misses = 0
+        self.weight = 0
+        self._entries = OrderedDict()
+        self._weights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def _put(self, key, value, weight):
+        self.weight -= self._weights.pop(key, 0)
+        if weight > self.max_weight:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._weights[key] = weight
+        self.weight += weight
+
+    def _evict(self):
+        while self.weight > self.max_weight:
+            evicted, _ = self._entries.popitem(last=False)
+            self.weight -= self._weights.pop(evicted)
+
+    def get(self, key):
+        """Return the value for `key` (marking it recently used), or None."""
+        with self._lock:
+            return self._get(key)
+
+    def get_many(self, keys):
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def put(self, key, value, weight=1):
+        """Add or replace `key`; replacing re-weighs the entry."""
+        with self._lock:
+            self._put(key, value, weight)
+            self._evict()
+
+    def put_many(self, items):
+        with self._lock:
+            for key, value in items:
+                self._put(key, value, 1)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._weights.clear()
+            self.weight = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'weight': self.weight, 'hits': self.hits, 'misses': self.misses}
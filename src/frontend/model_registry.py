@@ -0,0 +1,183 @@
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+from compact_model import is_compact, load_compact
+from forest_compiler import CompiledForest, compile_forest
+from vocab_encoder import VocabularyEncoder
+
+
+TRAINING_COLUMNS = [
+    'SourceType', 'TargetType', 'AuthRequired', 'Encryption', 'EncryptionType',
+    'DataFormat', 'Frequency', 'DataIntegrity', 'AccessType', 'AccessTarget',
+    'NetworkProtocol', 'CommunicationChannel', 'CredentialStorage', 'Interactor'
+]
+
+# Largest batch served by the compiled forest; see LoadedModel.predict
+COMPILED_MAX_ROWS = 1024
+
+
+class LoadedModel:
+    """A (model, encoder) artifact plus what it cost to load.
+
+    The artifact is either the training pickle (scikit-learn forest and
+    OneHotEncoder) or a compact model from `forest_compiler.py --export`
+    (CompiledForest and VocabularyEncoder over a mmap), which needs no
+    scikit-learn and no unpickling.
+    """
+
+    def __init__(self, path, model, encoder, load_seconds, memory_bytes):
+        self.path = path
+        self.model = model
+        self.encoder = encoder
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.warmup_seconds = None
+        self.mtime = os.path.getmtime(path)
+        # Identifies this artifact in prediction caches; changes on reload
+        self.version = f"{path}@{self.mtime}"
+        self.runtime = isinstance(model, CompiledForest)
+        if self.runtime:
+            self.vocabulary = encoder
+            self.compiled = model
+        else:
+            self.vocabulary = VocabularyEncoder.from_onehot(encoder)
+            self.compiled = None
+            if hasattr(model, 'estimators_') or hasattr(model, 'tree_'):
+                self.compiled = compile_forest(model)
+
+    @property
+    def classes_(self):
+        return self.model.classes_
+
+    def predict(self, X):
+        # The compiled forest has next to no per-call overhead, which wins for
+        # the small batches of interactive use; sklearn's Cython traversal is
+        # still faster once batches get large
+        if self.runtime or (self.compiled is not None and X.shape[0] <= COMPILED_MAX_ROWS):
+            return self.compiled.predict(X)
+        return self.model.predict(X)
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+            'memory_bytes': self.memory_bytes,
+            'compiled_bytes': self.compiled.nbytes if self.compiled is not None else 0,
+        }
+
+
+def memory_footprint(model, path):
+    """Approximate in-memory size: the node and value arrays of every tree.
+
+    Much cheaper than tracing allocations during the unpickle; models without
+    trees fall back to the artifact's size on disk.
+    """
+    if isinstance(model, CompiledForest):
+        return model.nbytes
+    from sklearn.tree._tree import NODE_DTYPE
+
+    total = 0
+    for estimator in getattr(model, 'estimators_', [model]):
+        tree = getattr(estimator, 'tree_', None)
+        if tree is not None:
+            total += tree.node_count * NODE_DTYPE.itemsize + tree.value.nbytes
+    return total or os.path.getsize(path)
+
+
+def check_feature_alignment(model, encoder):
+    """Verify once that the encoder's output columns are what the model was fit on.
+
+    The model is then fed the encoder's CSR output directly, so its stored
+    feature names are dropped to skip sklearn's per-call name check.
+    """
+    encoder_inputs = list(getattr(encoder, 'feature_names_in_', TRAINING_COLUMNS))
+    if encoder_inputs != TRAINING_COLUMNS:
+        raise ValueError(f"Encoder was fit on {encoder_inputs}, expected {TRAINING_COLUMNS}")
+
+    encoded_columns = list(encoder.get_feature_names_out())
+    model_columns = getattr(model, 'feature_names_in_', None)
+    if model_columns is not None:
+        if list(model_columns) != encoded_columns:
+            raise ValueError("Model features do not match the encoder's one-hot columns")
+        del model.feature_names_in_
+    elif model.n_features_in_ != len(encoded_columns):
+        raise ValueError(
+            f"Model expects {model.n_features_in_} features, encoder produces {len(encoded_columns)}"
+        )
+
+
+def check_runtime_alignment(compiled, vocabulary):
+    if vocabulary.columns != TRAINING_COLUMNS:
+        raise ValueError(f"Encoder was fit on {vocabulary.columns}, expected {TRAINING_COLUMNS}")
+    if compiled.n_features_in_ != vocabulary.n_features_out:
+        raise ValueError(
+            f"Model expects {compiled.n_features_in_} features, encoder produces {vocabulary.n_features_out}"
+        )
+
+
+def _load_artifact(path):
+    start = time.perf_counter()
+    if is_compact(path):
+        model, encoder = load_compact(path)
+    else:
+        with open(path, 'rb') as file:
+            model, encoder = pickle.load(file)
+    load_seconds = time.perf_counter() - start
+    if isinstance(model, CompiledForest):
+        check_runtime_alignment(model, encoder)
+    else:
+        check_feature_alignment(model, encoder)
+    return LoadedModel(path, model, encoder, load_seconds, memory_footprint(model, path))
+
+
+def warm_up(loaded):
+    """Run one dummy prediction so first-request costs are paid at startup."""
+    encoder = loaded.vocabulary
+    row = pd.DataFrame([[categories[0] for categories in encoder.categories_]], columns=TRAINING_COLUMNS)
+    start = time.perf_counter()
+    X = encoder.transform(row)
+    loaded.model.predict(X)
+    if loaded.compiled is not None and not loaded.runtime:
+        loaded.compiled.predict(X)
+    loaded.warmup_seconds = time.perf_counter() - start
+
+
+class ModelRegistry:
+    """Loads each model artifact once per process and hands out the shared copy.
+
+    Streamlit re-runs the app script on every interaction but keeps imported
+    modules, so a module-level registry is shared by all reruns and sessions.
+    An artifact is reloaded only if its file changes on disk.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            loaded = self._models.get(path)
+            if loaded is None or os.path.getmtime(path) != loaded.mtime:
+                loaded = _load_artifact(path)
+                warm_up(loaded)
+                self._models[path] = loaded
+            return loaded
+
+    def stats(self):
+        with self._lock:
+            return [loaded.stats() for loaded in self._models.values()]
+
+
+registry = ModelRegistry()
+
+
+def load_model(pickle_file):
+    """Return (predictor, encoder): the registry's LoadedModel and its VocabularyEncoder."""
+    loaded = registry.get(pickle_file)
+    return loaded, loaded.vocabulary
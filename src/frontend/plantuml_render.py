@@ -0,0 +1,247 @@
+import hashlib
+import os
+import subprocess
+import threading
+
+from atomic_file import atomic_write
+from lru import BoundedLRU
+
+
+DEFAULT_SERVER_URL = 'http://www.plantuml.com/plantuml/img/'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'threat_modeler', 'plantuml')
+
+
+class RenderError(Exception):
+    pass
+
+
+class ServerRenderer:
+    """Render through a PlantUML server, e.g. a local plantuml/plantuml-server container."""
+
+    def __init__(self, url=DEFAULT_SERVER_URL, timeout=60):
+        self.url = url
+        self.format = url.rstrip('/').rsplit('/', 1)[-1] or 'img'
+        self.timeout = timeout
+        self._client = None
+
+    def render(self, puml_content):
+        # plantuml pulls in an HTTP stack; only import it once a diagram misses the cache
+        import httplib2
+        from plantuml import PlantUML, PlantUMLError
+
+        if self._client is None:
+            self._client = PlantUML(url=self.url, http_opts={'timeout': self.timeout})
+        try:
+            return self._client.processes(puml_content)
+        except (PlantUMLError, OSError, httplib2.HttpLib2Error) as e:
+            # OSError covers refused connections and socket timeouts
+            raise RenderError(f"PlantUML server {self.url} failed: {e}") from e
+
+
+class JarRenderer:
+    """Render with a local plantuml.jar, no network access needed.
+
+    Diagrams must then include C4 from the bundled stdlib
+    (`!include <C4/C4_Container>`) rather than from GitHub.
+    """
+
+    def __init__(self, jar_path, java='java', fmt='png', timeout=60):
+        self.jar_path = jar_path
+        self.java = java
+        self.format = fmt
+        self.timeout = timeout
+
+    def render(self, puml_content):
+        command = [
+            self.java, '-Djava.awt.headless=true', '-jar', self.jar_path,
+            '-pipe', f'-t{self.format}', '-charset', 'UTF-8'
+        ]
+        try:
+            result = subprocess.run(
+                command, input=puml_content.encode('utf-8'),
+                capture_output=True, timeout=self.timeout, check=True
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            raise RenderError(f"plantuml.jar failed: {e}") from e
+        return result.stdout
+
+
+class RenderCache:
+    """Content-addressed cache in front of a renderer.
+
+    Images are keyed by a SHA-256 of the output format and the diagram
+    source, kept in an in-memory LRU and, if `cache_dir` is set, in a disk
+    store that is trimmed oldest-first once it grows past `max_disk_bytes`.
+    """
+
+    def __init__(self, renderer, max_memory_bytes=64 * 1024 * 1024,
+                 cache_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.renderer = renderer
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = BoundedLRU(max_memory_bytes)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+        self._disk_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    def key(self, puml_content):
+        digest = hashlib.sha256()
+        digest.update(self.renderer.format.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(puml_content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def render(self, puml_content):
+        key = self.key(puml_content)
+        data = self._get_memory(key)
+        if data is not None:
+            return data
+
+        # Only one thread renders a given diagram; the others wait for it
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                data = self._get_memory(key)
+                if data is None:
+                    data = self._read_disk(key)
+                    if data is None:
+                        self.misses += 1
+                        data = self.renderer.render(puml_content)
+                        self._write_disk(key, data)
+                    else:
+                        self.hits += 1
+                    self._put_memory(key, data)
+        finally:
+            # Also after a failed render, so failures don't leave locks behind
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return data
+
+    def _get_memory(self, key):
+        data = self._memory.get(key)
+        if data is not None:
+            with self._lock:
+                self.hits += 1
+        return data
+
+    def _put_memory(self, key, data):
+        self._memory.put(key, data, len(data))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.{self.renderer.format}")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            with atomic_write(path) as file:
+                file.write(data)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp') or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _evict_disk(self):
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+
+def image_format(data):
+    """Sniff rendered output: 'png', 'jpeg', 'gif', 'svg' or None."""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data.startswith(b'\xff\xd8'):
+        return 'jpeg'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if b'<svg' in data[:1024]:
+        return 'svg'
+    return None
+
+
+def renderer_from_env():
+    fmt = os.environ.get('PLANTUML_FORMAT')
+    jar_path = os.environ.get('PLANTUML_JAR')
+    if jar_path:
+        return JarRenderer(jar_path, java=os.environ.get('PLANTUML_JAVA', 'java'), fmt=fmt or 'png')
+    url = os.environ.get('PLANTUML_SERVER_URL', DEFAULT_SERVER_URL)
+    if fmt:
+        # The server picks the output format from the last path segment
+        url = f"{url.rstrip('/').rsplit('/', 1)[0]}/{fmt}/"
+    return ServerRenderer(url, timeout=float(os.environ.get('PLANTUML_TIMEOUT', '60')))
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """Process-wide render cache, configured from the environment on first use.
+
+    PLANTUML_JAR selects a local jar, otherwise PLANTUML_SERVER_URL (default:
+    the public server). PLANTUML_FORMAT=svg switches either one to vector
+    output (default png); PLANTUML_TIMEOUT bounds each server request in
+    seconds (default 60). PLANTUML_CACHE_DIR / PLANTUML_CACHE_MAX_MB control
+    the disk store; set PLANTUML_CACHE_DIR to an empty string to disable it.
+    """
+    global _render_cache
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache(
+                renderer_from_env(),
+                cache_dir=os.environ.get('PLANTUML_CACHE_DIR', DEFAULT_CACHE_DIR) or None,
+                max_disk_bytes=int(os.environ.get('PLANTUML_CACHE_MAX_MB', '512')) * 1024 * 1024,
+            )
+        return _render_cache
+
+
+def render_plantuml(puml_content):
+    return get_render_cache().render(puml_content)
@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from puml_parser import RELATION_MACROS, iter_lines, iter_statements, relationship
+
+
+def annotated_relationship(source, target, threat):
+    if threat and threat != "No Threat":
+        return f'Rel({source}, {target},"<color:red>{threat}")'
+    return f'Rel({source}, {target}, "{threat}")'
+
+
+def splice(content, edits):
+    """Apply (start, end, text) edits, sorted and non-overlapping, in one pass."""
+    parts = []
+    pos = 0
+    for start, end, text in edits:
+        parts.append(content[pos:start])
+        parts.append(text)
+        pos = end
+    parts.append(content[pos:])
+    return ''.join(parts)
+
+
+def _edits_from_spans(content, threats_df):
+    rows = zip(
+        threats_df['SpanStart'].tolist(), threats_df['SpanEnd'].tolist(),
+        threats_df['Source'].tolist(), threats_df['Target'].tolist(),
+        threats_df['Predicted_Threat'].tolist(),
+    )
+    edits = []
+    for start, end, source, target, threat in sorted(rows):
+        if not content.startswith(RELATION_MACROS, start):
+            raise ValueError("threats_df spans do not match the PUML content")
+        edits.append((start, end, annotated_relationship(source, target, threat)))
+    return edits
+
+
+def _edits_from_index(content, threats_df):
+    # (source, target) -> predictions in row order, so repeated pairs get
+    # their own prediction instead of all taking the first one
+    index = defaultdict(list)
+    for source, target, threat in zip(
+        threats_df['Source'].tolist(), threats_df['Target'].tolist(),
+        threats_df['Predicted_Threat'].tolist(),
+    ):
+        index[(source, target)].append(threat)
+    seen = defaultdict(int)
+
+    edits = []
+    for macro, args, start, end in iter_statements(iter_lines(content)):
+        if macro not in RELATION_MACROS:
+            continue
+        rel = relationship(args)
+        if rel is None:
+            continue
+        source, target, _ = rel
+        threats = index.get((source, target))
+        if not threats:
+            continue
+        n = seen[(source, target)]
+        seen[(source, target)] = n + 1
+        edits.append((start, end, annotated_relationship(source, target, threats[min(n, len(threats) - 1)])))
+    return edits
+
+
+def add_threats_to_puml(content, threats_df):
+    """Replace every Rel(...) call with its predicted threat.
+
+    Frames from parse_puml carry each call's character span, so the new text
+    is spliced in at those offsets; other frames are matched by
+    (Source, Target) through a hash index. Either way it is a single linear
+    pass over the content.
+    """
+    if 'SpanStart' in threats_df and 'SpanEnd' in threats_df:
+        edits = _edits_from_spans(content, threats_df)
+    else:
+        edits = _edits_from_index(content, threats_df)
+    return splice(content, edits)
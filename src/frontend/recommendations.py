@@ -0,0 +1,63 @@
+import os
+import threading
+
+import pandas as pd
+
+
+class RecommendationIndex:
+    """Recommendations.csv indexed by threat name.
+
+    Like the DataFrame lookup it replaces, the first row for a threat wins.
+    """
+
+    def __init__(self, path, mtime, by_threat):
+        self.path = path
+        self.mtime = mtime
+        self.by_threat = by_threat
+
+    @classmethod
+    def from_csv(cls, path):
+        mtime = os.path.getmtime(path)
+        df = pd.read_csv(path)
+        by_threat = {}
+        for threat, explanation, recommendation in zip(
+            df['Threat'].tolist(), df['Explanation'].tolist(), df['Recommendation'].tolist()
+        ):
+            by_threat.setdefault(threat, {
+                'Threat': threat,
+                'Explanation': explanation,
+                'Recommendation': recommendation,
+            })
+        return cls(path, mtime, by_threat)
+
+    def lookup(self, threats):
+        """Recommendations for `threats` in first-seen order, skipping unknown ones."""
+        by_threat = self.by_threat
+        return [dict(by_threat[threat]) for threat in dict.fromkeys(threats) if threat in by_threat]
+
+    def __len__(self):
+        return len(self.by_threat)
+
+
+class RecommendationStore:
+    """Process-wide cache of recommendation indexes, reloaded when the CSV changes."""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None or os.path.getmtime(path) != index.mtime:
+                index = RecommendationIndex.from_csv(path)
+                self._indexes[path] = index
+            return index
+
+
+store = RecommendationStore()
+
+
+def load_recommendations(path):
+    return store.get(path)
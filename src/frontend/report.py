@@ -0,0 +1,34 @@
+from io import BytesIO
+
+from plantuml_render import image_format
+
+
+def generate_pdf(diagram_image, recommendations):
+    """Build the DFD analysis report entirely in memory.
+
+    `diagram_image` is the rendered annotated diagram as returned by
+    render_plantuml (PNG, JPEG, GIF or SVG; SVG stays vector in the PDF).
+    Nothing touches the disk and no state is shared between calls, so
+    concurrent sessions can build reports at the same time.
+    """
+    # Deferred so that processes which never build a report never load fpdf
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+
+    pdf.set_font("helvetica", size=12)
+    pdf.cell(200, 10, text="DFD Analysis Report", new_x="LMARGIN", new_y="NEXT", align='C')
+
+    pdf.cell(200, 10, text="Annotated DFD with Predicted Threats:", new_x="LMARGIN", new_y="NEXT", align='L')
+    if diagram_image and image_format(diagram_image):
+        pdf.image(BytesIO(diagram_image), x=10, y=30, w=180)
+    else:
+        pdf.cell(200, 10, text="(diagram could not be rendered)", new_x="LMARGIN", new_y="NEXT", align='L')
+
+    pdf.add_page()
+    pdf.cell(200, 10, text="Recommendations:", new_x="LMARGIN", new_y="NEXT", align='L')
+    for rec in recommendations:
+        pdf.multi_cell(0, 10, text=f"Threat: {rec['Threat']}\nRecommendation: {rec['Recommendation']}\nExplanation: {rec['Explanation']}\n", border=1, new_x="LMARGIN", new_y="NEXT")
+
+    return BytesIO(pdf.output())
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark import synthetic_diagram, synthetic_model_path
+from compact_model import save_compact
+from forest_compiler import compile_forest
+from vocab_encoder import VocabularyEncoder
+
+FRONTEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# What the app and the workers import before they can serve a request
+# (Streamlit itself excluded)
+APP_MODULES = [
+    'puml_parser', 'puml_annotator', 'plantuml_render', 'report', 'model_registry',
+    'inference', 'recommendations', 'tracing', 'analysis_cache',
+]
+
+# Runs in a fresh interpreter: argv is frontend dir, artifact, diagram, modules
+PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+for name in sys.argv[4].split(','):
+    importlib.import_module(name)
+imported = time.perf_counter()
+from model_registry import load_model
+model, encoder = load_model(sys.argv[2])
+loaded = time.perf_counter()
+from inference import analyze_dfd
+from puml_parser import parse_puml
+with open(sys.argv[3], encoding='utf-8') as file:
+    analyze_dfd(model, encoder, parse_puml(file.read()))
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'load_ms': (loaded - imported) * 1000,
+    'first_request_ms': (done - loaded) * 1000,
+    'sklearn_imported': any(name.split('.')[0] == 'sklearn' for name in sys.modules),
+}))
+"""
+
+
+def cold_start(artifact, diagram_path, modules=APP_MODULES):
+    """Start a new interpreter, import `modules`, load `artifact` and analyze one diagram."""
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, FRONTEND_DIR, artifact, diagram_path, ','.join(modules)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output)
+    result['process_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def export_for(model_path, directory):
+    import pickle
+
+    with open(model_path, 'rb') as file:
+        model, encoder = pickle.load(file)
+    path = os.path.join(directory, 'model.tmodel')
+    save_compact(compile_forest(model), VocabularyEncoder.from_onehot(encoder), path)
+    return path
+
+
+def startup_benchmark(artifacts, diagram_path, runs=5, verbose=True):
+    """Median cold-start timings per artifact, each from `runs` separate processes."""
+    results = {}
+    for name, path in artifacts.items():
+        samples = [cold_start(path, diagram_path) for _ in range(runs)]
+        results[name] = {
+            key: float(np.median([sample[key] for sample in samples]))
+            for key in ('import_ms', 'load_ms', 'first_request_ms', 'process_ms')
+        }
+        results[name]['sklearn_imported'] = samples[0]['sklearn_imported']
+        results[name]['artifact_bytes'] = os.path.getsize(path)
+        if verbose:
+            stats = results[name]
+            print(
+                f"{name:<10} process {stats['process_ms']:>7.0f} ms  (imports {stats['import_ms']:>6.0f}, "
+                f"load {stats['load_ms']:>6.0f}, first request {stats['first_request_ms']:>6.0f})  "
+                f"sklearn {'yes' if stats['sklearn_imported'] else 'no'}, {stats['artifact_bytes'] / 2**20:.1f} MiB"
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure cold start (imports, model load, first request) in fresh processes."
+    )
+    parser.add_argument('-m', '--model', default=os.environ.get('THREAT_MODEL_PATH'),
+                        help="(model, encoder) pickle; a synthetic 100-tree forest is used if not given")
+    parser.add_argument('--compact', help="compact model to measure (default: exported from the model)")
+    parser.add_argument('--runs', type=int, default=5, help="processes started per artifact")
+    parser.add_argument('--relationships', type=int, default=20, help="size of the first request's diagram")
+    parser.add_argument('--budget', type=float, help="fail if the compact model's cold start exceeds this many seconds")
+    parser.add_argument('-o', '--output', help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = args.model or synthetic_model_path(directory)
+        diagram_path = os.path.join(directory, 'diagram.puml')
+        with open(diagram_path, 'w', encoding='utf-8') as file:
+            file.write(synthetic_diagram(args.relationships))
+        artifacts = {
+            'pickle': model_path,
+            'compact': args.compact or export_for(model_path, directory),
+        }
+        results = startup_benchmark(artifacts, diagram_path, args.runs)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Wrote {args.output}")
+    if args.budget is not None and results['compact']['process_ms'] > args.budget * 1000:
+        print(f"Compact model cold start is over the {args.budget:.2f}s budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
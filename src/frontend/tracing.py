@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus' default latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'threat_modeler'
+
+
+class Span:
+    """One timed stage. `relationships` and `bytes` attributes also feed the counters."""
+
+    __slots__ = ('tracer', 'name', 'attributes', 'start', 'seconds', 'error')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+        self.seconds = None
+        self.error = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        self.error = exc_type is not None
+        self.tracer._finish(self)
+        return False
+
+
+class _NoopSpan:
+    """What span() hands out while tracing is off: no clock reads, no allocation."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one request (a Streamlit rerun, an HTTP call), in completion order."""
+
+    def __init__(self):
+        self.spans = []
+
+    @property
+    def seconds(self):
+        return sum(span.seconds for span in self.spans)
+
+
+class Metrics:
+    """Per-stage histograms and counters, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span):
+        with self._lock:
+            stats = self._stages.get(span.name)
+            if stats is None:
+                stats = self._stages[span.name] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                    'errors': 0, 'relationships': 0, 'bytes': 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if span.seconds <= bound:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['sum'] += span.seconds
+            stats['errors'] += span.error
+            stats['relationships'] += span.attributes.get('relationships', 0)
+            stats['bytes'] += span.attributes.get('bytes', 0)
+
+    def render(self):
+        name = f'{METRIC_PREFIX}_stage_duration_seconds'
+        lines = [f'# HELP {name} Time spent per analysis stage.', f'# TYPE {name} histogram']
+        counters = {
+            'errors': ('stage_errors_total', 'Stage calls that raised.'),
+            'relationships': ('stage_relationships_total', 'Relationships processed per stage.'),
+            'bytes': ('stage_bytes_total', 'Bytes processed per stage.'),
+        }
+        with self._lock:
+            stages = {stage: dict(stats, buckets=list(stats['buckets'])) for stage, stats in self._stages.items()}
+        for stage, stats in sorted(stages.items()):
+            for bound, count in zip(self.buckets, stats['buckets']):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {stats["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+        for key, (suffix, help_text) in counters.items():
+            counter = f'{METRIC_PREFIX}_{suffix}'
+            lines.append(f'# HELP {counter} {help_text}')
+            lines.append(f'# TYPE {counter} counter')
+            for stage, stats in sorted(stages.items()):
+                lines.append(f'{counter}{{stage="{stage}"}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+class Tracer:
+    """Hands out spans and collects them into the current thread's trace and the metrics.
+
+    When disabled, span() returns NOOP_SPAN and start_trace() returns None,
+    so instrumented code pays one attribute check per stage.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.metrics = Metrics()
+        self._local = threading.local()
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def start_trace(self):
+        if not self.enabled:
+            return None
+        trace = Trace()
+        self._local.trace = trace
+        return trace
+
+    def _finish(self, span):
+        self.metrics.observe(span)
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.spans.append(span)
+
+
+tracer = Tracer(enabled=os.environ.get('THREAT_TRACING', '').lower() in ('1', 'true', 'yes'))
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Expose tracer.metrics at http://host:port/metrics from a daemon thread (once per process)."""
+    global _metrics_server
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = tracer.metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        return _metrics_server
+
+
+def serve_metrics_from_env():
+    """Start the metrics endpoint if tracing is on and THREAT_METRICS_PORT is set."""
+    port = os.environ.get('THREAT_METRICS_PORT')
+    if tracer.enabled and port:
+        serve_metrics(int(port), os.environ.get('THREAT_METRICS_HOST', '127.0.0.1'))
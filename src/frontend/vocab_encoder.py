@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def is_missing(value):
+    """True for the category values OneHotEncoder treats as missing: None, NaN and pd.NA.
+
+    Training (update.py) and serving share this check, so both sides agree
+    on which cells map to the missing-value column.
+    """
+    return value is None or value is pd.NA or (isinstance(value, float) and value != value)
+
+
+class VocabularyEncoder:
+    """One-hot encoder frozen from a fitted sklearn OneHotEncoder.
+
+    Every column's categories become a dict from value to its one-hot
+    column, so a transform is one dict lookup per cell followed by a single
+    vectorised build of the CSR arrays. The output matches
+    OneHotEncoder.transform exactly, including handle_unknown='ignore'
+    (an unknown value leaves its column block empty) and missing values
+    (None/NaN map to the NaN category if one was fitted).
+    """
+
+    def __init__(self, columns, categories, handle_unknown='ignore', dtype=np.float64):
+        self.columns = list(columns)
+        self.categories_ = [np.asarray(values) for values in categories]
+        self.handle_unknown = handle_unknown
+        self.dtype = dtype
+
+        self._lookups = []
+        self._missing_codes = []
+        offset = 0
+        for values in self.categories_:
+            lookup = {}
+            missing_code = -1
+            for code, value in enumerate(values.tolist()):
+                if is_missing(value):
+                    missing_code = offset + code
+                else:
+                    lookup[value] = offset + code
+            self._lookups.append(lookup)
+            self._missing_codes.append(missing_code)
+            offset += len(values)
+        self.n_features_out = offset
+
+    @classmethod
+    def from_onehot(cls, encoder):
+        if getattr(encoder, 'drop_idx_', None) is not None:
+            raise ValueError("OneHotEncoder with drop= is not supported")
+        if getattr(encoder, '_infrequent_enabled', False):
+            raise ValueError("OneHotEncoder with infrequent categories is not supported")
+        return cls(
+            encoder.feature_names_in_, encoder.categories_,
+            handle_unknown=encoder.handle_unknown, dtype=encoder.dtype,
+        )
+
+    def _encode_column(self, j, values):
+        lookup = self._lookups[j]
+        codes = [lookup.get(value, -1) for value in values]
+        if -1 in codes:
+            missing_code = self._missing_codes[j]
+            for i, code in enumerate(codes):
+                if code >= 0:
+                    continue
+                if is_missing(values[i]) and missing_code >= 0:
+                    codes[i] = missing_code
+                elif self.handle_unknown == 'error':
+                    raise ValueError(
+                        f"Found unknown category {values[i]!r} in column {self.columns[j]!r}"
+                    )
+        return codes
+
+    def _build(self, column_values, n_rows):
+        codes = np.empty((n_rows, len(self.columns)), dtype=np.int32)
+        for j, values in enumerate(column_values):
+            codes[:, j] = self._encode_column(j, values)
+
+        # Column blocks are laid out left to right, so the row-major order of
+        # the known codes is already the sorted CSR index order
+        known = codes >= 0
+        indices = codes[known]
+        indptr = np.zeros(n_rows + 1, dtype=np.int32)
+        np.cumsum(known.sum(axis=1), out=indptr[1:])
+        data = np.ones(len(indices), dtype=self.dtype)
+        return sparse.csr_matrix((data, indices, indptr), shape=(n_rows, self.n_features_out))
+
+    def transform(self, X):
+        """Encode a DataFrame holding the training columns."""
+        return self._build([X[column].tolist() for column in self.columns], len(X))
+
+    def transform_rows(self, rows):
+        """Encode a sequence of row tuples ordered like `columns`."""
+        rows = list(rows)
+        if not rows:
+            return self._build([[] for _ in self.columns], 0)
+        return self._build([list(values) for values in zip(*rows)], len(rows))
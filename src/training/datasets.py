@@ -0,0 +1,189 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+# The 14 features the model is trained on plus the label, as selected in
+# notebooks/algorithm.ipynb
+FEATURE_COLUMNS = [
+    'SourceType', 'TargetType', 'AuthRequired', 'Encryption', 'EncryptionType', 'DataFormat', 'Frequency',
+    'DataIntegrity', 'AccessType', 'AccessTarget', 'NetworkProtocol', 'CommunicationChannel',
+    'CredentialStorage', 'Interactor',
+]
+LABEL_COLUMN = 'Threat'
+DATASET_COLUMNS = FEATURE_COLUMNS + [LABEL_COLUMN]
+
+CACHE_VERSION = 2
+
+
+@contextmanager
+def atomic_write(path, mode='wb', **kwargs):
+    """Write `path` via a per-writer temp file that replaces it only if the block succeeds.
+
+    Used for every cache entry and artifact, so an interrupted run never
+    leaves a truncated Parquet copy, stage pickle or model behind.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_source(path):
+    """Read an .xlsx or .csv dataset the slow way, as the notebook does.
+
+    CSVs from the scenario generator name their columns "Source Type" etc.;
+    the spaces are dropped to match the spreadsheets.
+    """
+    if path.lower().endswith('.csv'):
+        df = pd.read_csv(path)
+        df.columns = [str(column).replace(' ', '') for column in df.columns]
+        return df
+    return pd.read_excel(path)
+
+
+def to_categorical(df):
+    """Convert every non-numeric column to `category`.
+
+    Excel cells that hold numbers in an otherwise textual column are turned
+    into strings first, so each column gets one category type.
+    """
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            columns[column] = series
+            continue
+        values = series.where(series.isna(), series.astype(str))
+        columns[column] = values.astype('category')
+    return pd.DataFrame(columns, index=df.index)
+
+
+class DatasetCache:
+    """Parquet copies of the training spreadsheets with `category` columns.
+
+    Each source file is converted once into `<cache_dir>/<name>.parquet`
+    next to a small JSON file recording the source's size, mtime and
+    SHA-256. A cached copy is used while size and mtime are unchanged; if
+    they differ (or `verify='hash'`), the content hash decides, so a touched
+    but identical file is not converted again.
+    """
+
+    def __init__(self, cache_dir=None, verify='mtime'):
+        if verify not in ('mtime', 'hash'):
+            raise ValueError("verify must be 'mtime' or 'hash'")
+        self.cache_dir = cache_dir
+        self.verify = verify
+
+    def paths(self, source):
+        cache_dir = self.cache_dir or os.path.join(os.path.dirname(os.path.abspath(source)), '.cache')
+        name = os.path.basename(source)
+        return os.path.join(cache_dir, f"{name}.parquet"), os.path.join(cache_dir, f"{name}.json")
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path, encoding='utf-8') as file:
+                meta = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta if meta.get('version') == CACHE_VERSION else None
+
+    def _write_meta(self, meta_path, meta):
+        with atomic_write(meta_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file, indent=2)
+
+    def ensure(self, source):
+        """Return the path of an up-to-date Parquet copy of `source`."""
+        parquet_path, meta_path = self.paths(source)
+        stat = os.stat(source)
+        meta = self._read_meta(meta_path)
+        if meta is not None and os.path.exists(parquet_path):
+            unchanged = meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns
+            if unchanged and self.verify == 'mtime':
+                return parquet_path
+            digest = file_digest(source)
+            if digest == meta['sha256']:
+                if not unchanged:
+                    self._write_meta(meta_path, dict(meta, size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+                return parquet_path
+        else:
+            digest = file_digest(source)
+
+        df = to_categorical(read_source(source))
+        os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+        with atomic_write(parquet_path) as file:
+            df.to_parquet(file, index=False)
+        self._write_meta(meta_path, {
+            'version': CACHE_VERSION,
+            'source': os.path.abspath(source),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'rows': len(df),
+            'columns': [str(column) for column in df.columns],
+        })
+        return parquet_path
+
+    def digest(self, source):
+        """SHA-256 of `source` as recorded when its cache was checked."""
+        self.ensure(source)
+        return self._read_meta(self.paths(source)[1])['sha256']
+
+    def load(self, source, columns=None):
+        return pd.read_parquet(self.ensure(source), columns=columns)
+
+
+def load_dataset(path, columns=None, cache_dir=None, verify='mtime'):
+    """Load a training dataset through the Parquet cache.
+
+    `columns` selects a subset, e.g. DATASET_COLUMNS for the features and
+    label the model is trained on. Text columns come back as `category`.
+    """
+    return DatasetCache(cache_dir, verify).load(path, columns=columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh the Parquet cache of the training datasets.")
+    parser.add_argument('paths', nargs='+', help=".xlsx or .csv datasets")
+    parser.add_argument('--cache-dir', help="defaults to a .cache directory next to each dataset")
+    parser.add_argument('--verify', choices=['mtime', 'hash'], default='mtime')
+    args = parser.parse_args(argv)
+
+    cache = DatasetCache(args.cache_dir, args.verify)
+    for path in args.paths:
+        start = time.perf_counter()
+        parquet_path = cache.ensure(path)
+        ensured = time.perf_counter() - start
+        start = time.perf_counter()
+        df = pd.read_parquet(parquet_path)
+        loaded = time.perf_counter() - start
+        print(
+            f"{path}: {len(df)} rows, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory, "
+            f"cache checked/built in {ensured:.2f}s, loaded in {loaded * 1000:.0f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
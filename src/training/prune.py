@@ -0,0 +1,323 @@
+import argparse
+import copy
+import json
+import pickle
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.tree._tree import Tree
+
+from datasets import FEATURE_COLUMNS, DatasetCache
+from train import clean_stage, load_stage, save_artifact, split_stage
+from update import labels_of, load_frames
+
+# Rows used to order the trees; per-tree probabilities are held for all of them
+MAX_SELECTION_ROWS = 5000
+
+# Share of rows the pruned forest must predict as the original does
+MIN_AGREEMENT = 0.99
+
+
+def tree_probabilities(model, X):
+    """Per-tree class probabilities, shape (n_trees, n_samples, n_classes), as float32."""
+    return np.stack([estimator.predict_proba(X).astype(np.float32) for estimator in model.estimators_])
+
+
+def class_indices(model, labels):
+    # Labels the model has never seen can't be predicted; -1 never matches
+    index = {label: i for i, label in enumerate(model.classes_.tolist())}
+    return np.array([index.get(label, -1) for label in labels], dtype=np.intp)
+
+
+def greedy_order(probabilities, y, chunk_size=64):
+    """Yield tree indices in reduce-error order.
+
+    Each step adds the tree whose averaged vote is most accurate together
+    with the trees already chosen (ties go to the larger probability on the
+    true class). Stopping after k steps gives the best k-tree subset this
+    ordering finds.
+    """
+    n_trees, n_samples, _ = probabilities.shape
+    rows = np.arange(n_samples)
+    total = np.zeros(probabilities.shape[1:], dtype=np.float32)
+    remaining = np.arange(n_trees)
+    while remaining.size:
+        accuracy = np.empty(remaining.size)
+        margin = np.empty(remaining.size)
+        for start in range(0, remaining.size, chunk_size):
+            candidates = total + probabilities[remaining[start:start + chunk_size]]
+            accuracy[start:start + chunk_size] = (candidates.argmax(axis=2) == y).mean(axis=1)
+            margin[start:start + chunk_size] = np.where(y >= 0, candidates[:, rows, y], 0).mean(axis=1)
+        best = np.lexsort((margin, accuracy))[-1]
+        tree = remaining[best]
+        total += probabilities[tree]
+        remaining = np.delete(remaining, best)
+        yield int(tree)
+
+
+def scores(labels, predicted):
+    return {
+        'accuracy': accuracy_score(labels, predicted),
+        'f1_macro': f1_score(labels, predicted, average='macro', zero_division=0),
+    }
+
+
+class Budget:
+    """How far a pruned forest may fall behind the original on a set of rows."""
+
+    def __init__(self, max_accuracy_drop=0.005, max_f1_drop=0.01, min_agreement=MIN_AGREEMENT):
+        self.max_accuracy_drop = max_accuracy_drop
+        self.max_f1_drop = max_f1_drop
+        self.min_agreement = min_agreement
+
+    def allows(self, score, baseline):
+        return (score['accuracy'] >= baseline['accuracy'] - self.max_accuracy_drop
+                and score['f1_macro'] >= baseline['f1_macro'] - self.max_f1_drop
+                and score['agreement'] >= self.min_agreement)
+
+
+def compare_scores(labels, predicted, reference):
+    """scores() plus the share of rows predicted as the original forest did."""
+    return dict(scores(labels, predicted), agreement=float((predicted == reference).mean()))
+
+
+def truncate_tree(tree, max_depth):
+    """Copy of a fitted sklearn Tree cut at `max_depth`; nodes at that depth become leaves.
+
+    Internal nodes already store the class distribution of their samples,
+    so a cut node predicts exactly what its subtree's samples averaged to.
+    Nodes below the cut are dropped and the rest keep their depth-first order.
+    """
+    state = tree.__getstate__()
+    nodes = state['nodes']
+    depth = np.zeros(len(nodes), dtype=np.intp)
+    frontier = np.array([0])
+    level = 0
+    while frontier.size:
+        depth[frontier] = level
+        children = np.concatenate([nodes['left_child'][frontier], nodes['right_child'][frontier]])
+        frontier = children[children >= 0]
+        level += 1
+
+    kept = np.flatnonzero(depth <= max_depth)
+    new_index = np.full(len(nodes), -1, dtype=np.intp)
+    new_index[kept] = np.arange(len(kept))
+    truncated = nodes[kept].copy()
+    cut = (depth[kept] == max_depth) & (truncated['left_child'] >= 0)
+    truncated['left_child'][cut] = -1
+    truncated['right_child'][cut] = -1
+    truncated['feature'][cut] = -2
+    truncated['threshold'][cut] = -2.0
+    split = truncated['left_child'] >= 0
+    truncated['left_child'][split] = new_index[truncated['left_child'][split]]
+    truncated['right_child'][split] = new_index[truncated['right_child'][split]]
+
+    rebuilt = Tree(tree.n_features, np.asarray(tree.n_classes, dtype=np.intp), tree.n_outputs)
+    rebuilt.__setstate__(dict(
+        state, max_depth=min(state['max_depth'], max_depth), node_count=len(kept),
+        nodes=truncated, values=np.ascontiguousarray(state['values'][kept]),
+    ))
+    return rebuilt
+
+
+def subset_forest(model, trees, max_depth=None):
+    """A copy of `model` with only the estimators at `trees`, optionally cut at `max_depth`."""
+    estimators = []
+    for i in trees:
+        estimator = model.estimators_[i]
+        if max_depth is not None and estimator.tree_.max_depth > max_depth:
+            estimator = copy.copy(estimator)
+            estimator.tree_ = truncate_tree(estimator.tree_, max_depth)
+            estimator.max_depth = max_depth
+        estimators.append(estimator)
+    pruned = copy.copy(model)
+    for attribute in ('oob_score_', 'oob_decision_function_'):
+        pruned.__dict__.pop(attribute, None)
+    pruned.estimators_ = estimators
+    pruned.n_estimators = len(estimators)
+    if max_depth is not None:
+        pruned.max_depth = max_depth
+    return pruned
+
+
+def prune_forest(model, X_select, y_select, X_verify, y_verify, budget=None, depths=(), verbose=True):
+    """Smallest reduce-error prefix of the trees (then shallowest depth) within the drop budget.
+
+    The trees are ordered on the selection rows; a prefix is accepted only
+    when it stays within budget on both the selection and the verification
+    rows, so the choice is not fitted to the rows it is judged on. Returns
+    (pruned_model, trees, max_depth, curve), `curve` holding the scores of
+    every prefix tried.
+    """
+    budget = budget or Budget()
+    sets = {'select': (X_select, y_select), 'verify': (X_verify, y_verify)}
+    reference = {name: model.predict(X) for name, (X, _) in sets.items()}
+    baseline = {name: compare_scores(labels, reference[name], reference[name]) for name, (_, labels) in sets.items()}
+    probabilities = {name: tree_probabilities(model, X) for name, (X, _) in sets.items()}
+    targets = {name: class_indices(model, labels) for name, (_, labels) in sets.items()}
+    totals = {name: np.zeros(p.shape[1:], dtype=np.float32) for name, p in probabilities.items()}
+
+    trees, curve = [], []
+    for tree in greedy_order(probabilities['select'], targets['select']):
+        trees.append(tree)
+        prefix = {}
+        for name, (_, labels) in sets.items():
+            totals[name] += probabilities[name][tree]
+            predicted = model.classes_.take(totals[name].argmax(axis=1))
+            prefix[name] = compare_scores(labels, predicted, reference[name])
+        curve.append({'trees': len(trees), **prefix})
+        if all(budget.allows(prefix[name], baseline[name]) for name in sets):
+            break
+    if verbose:
+        print(f"{len(trees)} of {len(model.estimators_)} trees stay within budget")
+
+    chosen_depth = None
+    for depth in sorted(depths):
+        candidate = subset_forest(model, trees, depth)
+        depth_scores = {
+            name: compare_scores(labels, candidate.predict(X), reference[name]) for name, (X, labels) in sets.items()
+        }
+        passed = all(budget.allows(depth_scores[name], baseline[name]) for name in sets)
+        if verbose:
+            print(f"  max_depth {depth}: verify accuracy {depth_scores['verify']['accuracy']:.4f} "
+                  f"{'ok' if passed else 'over budget'}")
+        if passed:
+            chosen_depth = depth
+            break
+    return subset_forest(model, trees, chosen_depth), trees, chosen_depth, curve
+
+
+def node_count(model):
+    return sum(estimator.tree_.node_count for estimator in model.estimators_)
+
+
+def median_seconds(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def describe(model, encoder, X, labels, reference=None, repeats=5):
+    """Size, latency and accuracy of `model` on (X, labels), plus agreement with `reference` predictions."""
+    predicted = model.predict(X)
+    stats = {
+        'trees': len(model.estimators_),
+        'nodes': node_count(model),
+        'max_depth': max(estimator.tree_.max_depth for estimator in model.estimators_),
+        'pickle_bytes': len(pickle.dumps((model, encoder), protocol=pickle.HIGHEST_PROTOCOL)),
+        'row_ms': median_seconds(lambda: model.predict(X[:1]), repeats) * 1000,
+        'batch_ms': median_seconds(lambda: model.predict(X), repeats) * 1000,
+        **scores(labels, predicted),
+    }
+    if reference is not None:
+        stats['agreement'] = float((predicted == reference).mean())
+    return stats, predicted
+
+
+def load_holdout(paths, dataset_cache, exclude_threats, test_split=None):
+    """The hold-out rows: all of `paths`, or only the test split train.py kept back from them.
+
+    `test_split` is (test_size, random_state, min_class_count), matching
+    the train.py arguments the model was trained with.
+    """
+    if test_split is None:
+        return load_frames(paths, dataset_cache, exclude_threats)
+    test_size, random_state, min_class_count = test_split
+    data = clean_stage(load_stage(paths, dataset_cache), min_class_count, exclude_threats)
+    _, test_index = split_stage(labels_of(data), test_size, random_state)
+    return data.iloc[test_index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Shrink a random forest to the fewest trees (and optionally the shallowest depth) "
+                    "that keep accuracy and macro F1 on hold-out data within a budget."
+    )
+    parser.add_argument('model', help="(model, encoder) pickle to prune")
+    parser.add_argument('holdout', nargs='+', help="hold-out .csv/.xlsx data the model was not trained on")
+    parser.add_argument('--test-split', action='store_true',
+                        help="HOLDOUT is the training data; use only the test rows train.py held out from it")
+    parser.add_argument('--test-size', type=float, default=0.2, help="with --test-split, as passed to train.py")
+    parser.add_argument('--min-class-count', type=int, default=20, help="with --test-split, as passed to train.py")
+    parser.add_argument('--random-state', type=int, default=42, help="train.py's split seed; also splits the hold-out")
+    parser.add_argument('--exclude-threat', action='append', default=[], help="drop a threat class (repeatable)")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.005)
+    parser.add_argument('--max-f1-drop', type=float, default=0.01, help="allowed drop in macro F1")
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT,
+                        help="share of hold-out rows that must keep the original forest's prediction (0 disables)")
+    parser.add_argument('--depths', type=int, nargs='*', default=[],
+                        help="also try cutting the kept trees at these depths; the shallowest within budget wins")
+    parser.add_argument('--verify-size', type=float, default=0.5,
+                        help="share of the hold-out kept for verification rather than ordering the trees")
+    parser.add_argument('-o', '--output', help="where to write the pruned (model, encoder) pickle")
+    parser.add_argument('--report', help="write the size/latency/accuracy report as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.model, 'rb') as file:
+        model, encoder = pickle.load(file)
+    if not hasattr(model, 'estimators_'):
+        print("Only tree ensembles can be pruned.", file=sys.stderr)
+        return 1
+
+    test_split = (args.test_size, args.random_state, args.min_class_count) if args.test_split else None
+    holdout = load_holdout(args.holdout, DatasetCache(), args.exclude_threat, test_split)
+    X = encoder.transform(holdout[FEATURE_COLUMNS])
+    labels = labels_of(holdout)
+    select_rows, verify_rows = train_test_split(
+        np.arange(len(labels)), test_size=args.verify_size, random_state=args.random_state,
+    )
+    select_rows = select_rows[:MAX_SELECTION_ROWS]
+    print(f"{len(labels)} hold-out rows: {len(select_rows)} order the trees, {len(verify_rows)} verify")
+
+    start = time.perf_counter()
+    pruned, trees, depth, curve = prune_forest(
+        model, X[select_rows], labels[select_rows], X[verify_rows], labels[verify_rows],
+        budget=Budget(args.max_accuracy_drop, args.max_f1_drop, args.min_agreement), depths=args.depths,
+    )
+    print(f"Pruning took {time.perf_counter() - start:.1f}s")
+
+    X_verify, y_verify = X[verify_rows], labels[verify_rows]
+    original, reference = describe(model, encoder, X_verify, y_verify)
+    result, _ = describe(pruned, encoder, X_verify, y_verify, reference)
+    print(f"\n{'on the verification rows':<26}{'original':>14}{'pruned':>14}{'ratio':>9}")
+    for key, label in [('trees', 'trees'), ('nodes', 'nodes'), ('max_depth', 'max depth'),
+                       ('pickle_bytes', 'pickle bytes'), ('row_ms', 'predict 1 row (ms)'),
+                       ('batch_ms', f'predict {len(verify_rows)} rows (ms)')]:
+        ratio = result[key] / original[key] if original[key] else float('nan')
+        print(f"{label:<26}{original[key]:>14,.2f}{result[key]:>14,.2f}{ratio:>8.2f}x")
+    for key, label in [('accuracy', 'accuracy'), ('f1_macro', 'macro F1')]:
+        print(f"{label:<26}{original[key]:>14.4f}{result[key]:>14.4f}{result[key] - original[key]:>+9.4f}")
+    print(f"{'same prediction':<26}{'':>14}{result['agreement']:>14.2%}")
+    agreed = result['agreement'] >= args.min_agreement
+    print(f"Agreement with the original: {result['agreement']:.2%} "
+          f"({'meets' if agreed else 'below'} the {args.min_agreement:.2%} minimum)")
+
+    if args.report:
+        report = {
+            'budget': {
+                'max_accuracy_drop': args.max_accuracy_drop, 'max_f1_drop': args.max_f1_drop,
+                'min_agreement': args.min_agreement,
+            },
+            'trees': trees, 'max_depth': depth, 'original': original, 'pruned': result, 'curve': curve,
+            'accepted': agreed,
+        }
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Wrote {args.report}")
+    if not agreed:
+        print("Pruned model rejected, nothing written.", file=sys.stderr)
+        return 1
+    if args.output:
+        save_artifact(pruned, encoder, args.output)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import OneHotEncoder
+
+from datasets import DATASET_COLUMNS, FEATURE_COLUMNS, LABEL_COLUMN, DatasetCache, atomic_write
+
+# Bump when a stage's output format or logic changes, to orphan old entries
+PIPELINE_VERSION = 1
+
+
+class StageCache:
+    """On-disk memo of pipeline stages.
+
+    Each stage result is pickled under `<cache_dir>/<stage>-<key>.pkl`,
+    where the key hashes the stage name, its parameters and the keys of the
+    stages it consumed. Changing a parameter therefore re-runs that stage and
+    everything downstream, and nothing upstream.
+    """
+
+    def __init__(self, cache_dir, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.log = []
+
+    @staticmethod
+    def key(stage, params, parents=()):
+        payload = json.dumps(
+            {'stage': stage, 'version': PIPELINE_VERSION, 'params': params, 'parents': list(parents)},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+    def run(self, stage, key, fn):
+        path = os.path.join(self.cache_dir, f"{stage}-{key}.pkl")
+        start = time.perf_counter()
+        if self.enabled:
+            try:
+                with open(path, 'rb') as file:
+                    result = pickle.load(file)
+                self.log.append((stage, 'cached', time.perf_counter() - start))
+                return result
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                pass
+
+        result = fn()
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with atomic_write(path) as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.log.append((stage, 'computed', time.perf_counter() - start))
+        return result
+
+
+class Prepared:
+    """Encoded dataset ready for fitting: sparse X, string labels, fitted encoder, split indices."""
+
+    def __init__(self, X, y, encoder, train_index, test_index, key):
+        self.X = X
+        self.y = y
+        self.encoder = encoder
+        self.train_index = train_index
+        self.test_index = test_index
+        self.key = key
+
+    @property
+    def X_train(self):
+        return self.X[self.train_index]
+
+    @property
+    def y_train(self):
+        return self.y[self.train_index]
+
+    @property
+    def X_test(self):
+        return self.X[self.test_index]
+
+    @property
+    def y_test(self):
+        return self.y[self.test_index]
+
+
+def load_stage(paths, dataset_cache):
+    frames = [dataset_cache.load(path, columns=DATASET_COLUMNS) for path in paths]
+    if len(frames) == 1:
+        return frames[0]
+    # Categories differ between files; union them so the concat stays categorical
+    return pd.concat(
+        [frame.astype(object) for frame in frames], ignore_index=True
+    ).astype('category')
+
+
+def clean_stage(data, min_class_count, exclude_threats):
+    # Same cleaning as the notebook: blanks are missing values, rare and
+    # excluded threat classes are dropped
+    data = data.replace([None, ''], pd.NA)
+    data = data[data[LABEL_COLUMN].notna()]
+    if exclude_threats:
+        data = data[~data[LABEL_COLUMN].isin(exclude_threats)]
+    class_counts = data[LABEL_COLUMN].value_counts()
+    valid_classes = class_counts[class_counts > min_class_count].index
+    data = data[data[LABEL_COLUMN].isin(valid_classes)]
+    return data.reset_index(drop=True)
+
+
+def encode_stage(data):
+    encoder = OneHotEncoder(handle_unknown='ignore')
+    X = encoder.fit_transform(data[FEATURE_COLUMNS]).tocsr()
+    y = data[LABEL_COLUMN].astype(str).to_numpy(dtype=object)
+    return X, y, encoder
+
+
+def split_stage(y, test_size, random_state):
+    indices = np.arange(len(y))
+    train_index, test_index = train_test_split(
+        indices, test_size=test_size, random_state=random_state, stratify=y
+    )
+    return np.sort(train_index), np.sort(test_index)
+
+
+def prepare(paths, stages, dataset_cache=None, min_class_count=20, exclude_threats=(),
+            test_size=0.2, random_state=42):
+    """Run (or fetch from `stages`) load -> clean -> encode -> split."""
+    dataset_cache = dataset_cache or DatasetCache()
+    digests = [dataset_cache.digest(path) for path in paths]
+
+    load_key = stages.key('load', {'columns': DATASET_COLUMNS}, digests)
+    data = stages.run('load', load_key, lambda: load_stage(paths, dataset_cache))
+
+    clean_params = {'min_class_count': min_class_count, 'exclude_threats': sorted(exclude_threats)}
+    clean_key = stages.key('clean', clean_params, [load_key])
+    data = stages.run('clean', clean_key, lambda: clean_stage(data, min_class_count, list(exclude_threats)))
+
+    encode_key = stages.key('encode', {}, [clean_key])
+    X, y, encoder = stages.run('encode', encode_key, lambda: encode_stage(data))
+
+    split_key = stages.key('split', {'test_size': test_size, 'random_state': random_state}, [encode_key])
+    train_index, test_index = stages.run('split', split_key, lambda: split_stage(y, test_size, random_state))
+
+    return Prepared(X, y, encoder, train_index, test_index, split_key)
+
+
+def save_artifact(model, encoder, path):
+    """Write the (model, encoder) pickle that the frontend's model registry loads."""
+    with atomic_write(path) as file:
+        pickle.dump((model, encoder), file)
+
+
+def add_data_arguments(parser):
+    parser.add_argument('datasets', nargs='+', help=".xlsx or .csv training data, e.g. data/data_15k.xlsx")
+    parser.add_argument('--cache-dir', help="stage cache, defaults to .cache/stages next to the first dataset")
+    parser.add_argument('--no-cache', action='store_true', help="recompute every stage")
+    parser.add_argument('--min-class-count', type=int, default=20, help="drop threats with this many rows or fewer")
+    parser.add_argument('--exclude-threat', action='append', default=[], help="drop a threat class (repeatable)")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--random-state', type=int, default=42)
+
+
+def prepare_from_args(args):
+    cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.datasets[0])), '.cache', 'stages')
+    stages = StageCache(cache_dir, enabled=not args.no_cache)
+    prepared = prepare(
+        args.datasets, stages, min_class_count=args.min_class_count, exclude_threats=args.exclude_threat,
+        test_size=args.test_size, random_state=args.random_state,
+    )
+    for stage, status, seconds in stages.log:
+        print(f"{stage:>6}: {status} in {seconds:.2f}s")
+    print(
+        f"{prepared.X.shape[0]} rows, {prepared.X.shape[1]} one-hot features "
+        f"({prepared.X.nnz} non-zeros), {len(prepared.train_index)} train / {len(prepared.test_index)} test"
+    )
+    return prepared
+
+
+def max_features_arg(value):
+    if value in ('sqrt', 'log2'):
+        return value
+    if value == 'None':
+        return None
+    return float(value) if '.' in value else int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the threat classifier and write the (model, encoder) pickle.")
+    add_data_arguments(parser)
+    parser.add_argument('-o', '--output', required=True, help="where to write the (model, encoder) pickle")
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--min-samples-split', type=int, default=2)
+    parser.add_argument('--min-samples-leaf', type=int, default=1)
+    parser.add_argument('--max-features', type=max_features_arg, default='sqrt')
+    parser.add_argument('--criterion', choices=['gini', 'entropy', 'log_loss'], default='gini')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    args = parser.parse_args(argv)
+
+    prepared = prepare_from_args(args)
+
+    model = RandomForestClassifier(
+        n_estimators=args.n_estimators, max_depth=args.max_depth, min_samples_split=args.min_samples_split,
+        min_samples_leaf=args.min_samples_leaf, max_features=args.max_features, criterion=args.criterion,
+        random_state=args.random_state, n_jobs=args.n_jobs,
+    )
+    start = time.perf_counter()
+    model.fit(prepared.X_train, prepared.y_train)
+    print(f"   fit: {time.perf_counter() - start:.2f}s")
+
+    y_pred = model.predict(prepared.X_test)
+    print("\nClassification Report:")
+    print(classification_report(prepared.y_test, y_pred, zero_division=0))
+    print("Accuracy Score:", accuracy_score(prepared.y_test, y_pred))
+
+    save_artifact(model, prepared.encoder, args.output)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import argparse
+import copy
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.tree._tree import Tree
+
+from datasets import FEATURE_COLUMNS, LABEL_COLUMN, DatasetCache
+from train import clean_stage, load_stage, save_artifact
+
+# The serving side's definition of a missing category, so both agree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
+from vocab_encoder import is_missing  # noqa: E402
+
+
+def merge_categories(known, values):
+    """Known categories plus unseen `values`, sorted as OneHotEncoder would, missing value last."""
+    present = [category for category in known if not is_missing(category)]
+    merged = set(present) | {str(value) for value in values if not is_missing(value)}
+    categories = sorted(merged)
+    if len(present) < len(known) or any(is_missing(value) for value in values):
+        categories.append(np.nan)
+    return np.array(categories, dtype=object)
+
+
+def extend_encoder(encoder, df):
+    """Return an encoder whose vocabulary also covers `df`, and where each old one-hot column moved.
+
+    Nothing already encoded is re-encoded: the returned map (old column
+    index -> new column index) is applied to the split features of the
+    existing trees instead.
+    """
+    if list(getattr(encoder, 'feature_names_in_', FEATURE_COLUMNS)) != FEATURE_COLUMNS:
+        raise ValueError(f"Encoder was not fit on {FEATURE_COLUMNS}")
+    categories = [
+        merge_categories(known, df[column].unique()) for known, column in zip(encoder.categories_, FEATURE_COLUMNS)
+    ]
+    extended = OneHotEncoder(categories=categories, handle_unknown='ignore', dtype=encoder.dtype)
+    extended.fit(df[FEATURE_COLUMNS])
+
+    new_index = {name: i for i, name in enumerate(extended.get_feature_names_out())}
+    feature_map = np.array([new_index[name] for name in encoder.get_feature_names_out()], dtype=np.intp)
+    return extended, feature_map
+
+
+def rebuild_tree(tree, n_features, n_classes, feature_map=None, class_index=None):
+    """Copy of a fitted sklearn Tree with remapped split features and/or a wider class axis."""
+    state = tree.__getstate__()
+    nodes = state['nodes'].copy()
+    if feature_map is not None:
+        split = nodes['feature'] >= 0
+        nodes['feature'][split] = feature_map[nodes['feature'][split]]
+    values = state['values']
+    if class_index is not None:
+        widened = np.zeros(values.shape[:2] + (n_classes,), dtype=values.dtype)
+        widened[:, :, class_index] = values
+        values = widened
+    rebuilt = Tree(n_features, np.array([n_classes], dtype=np.intp), 1)
+    rebuilt.__setstate__(dict(state, nodes=nodes, values=np.ascontiguousarray(values)))
+    return rebuilt
+
+
+def align_estimator(estimator, n_features, n_classes, feature_map=None, class_index=None):
+    # Shallow copy so the model being replaced stays usable for the comparison
+    aligned = copy.copy(estimator)
+    aligned.tree_ = rebuild_tree(estimator.tree_, n_features, n_classes, feature_map, class_index)
+    aligned.n_features_in_ = n_features
+    aligned.n_classes_ = n_classes
+    # Trees inside a forest are fit on class indices, not labels
+    aligned.classes_ = np.arange(n_classes, dtype=np.float64)
+    return aligned
+
+
+def labels_of(df):
+    return df[LABEL_COLUMN].astype(str).to_numpy(dtype=object)
+
+
+def incremental_update(model, encoder, new_data, n_new_trees=50, max_trees=None, random_state=None, n_jobs=-1):
+    """Grow `model` with trees fit on `new_data` only, retiring the oldest trees beyond `max_trees`.
+
+    The encoder vocabulary is extended with the new categories and new threat
+    classes are added to every tree's class axis, so the cost depends on the
+    size of `new_data` and of the forest, never on the data the model was
+    originally trained on. Returns (candidate, extended_encoder, summary).
+    """
+    max_trees = max_trees or len(model.estimators_)
+    extended, feature_map = extend_encoder(encoder, new_data)
+    n_features = len(extended.get_feature_names_out())
+    y_new = labels_of(new_data)
+    classes = np.union1d(model.classes_.astype(object), np.unique(y_new)).astype(object)
+    n_classes = len(classes)
+
+    params = model.get_params()
+    params.update(n_estimators=n_new_trees, warm_start=False, oob_score=False, n_jobs=n_jobs)
+    if random_state is not None:
+        params['random_state'] = random_state
+    fresh = RandomForestClassifier(**params)
+    fresh.fit(extended.transform(new_data[FEATURE_COLUMNS]), y_new)
+
+    old_class_index = np.searchsorted(classes, model.classes_.astype(object))
+    fresh_class_index = np.searchsorted(classes, fresh.classes_.astype(object))
+    old_trees = [
+        align_estimator(estimator, n_features, n_classes, feature_map, old_class_index)
+        for estimator in model.estimators_
+    ]
+    new_trees = [
+        align_estimator(estimator, n_features, n_classes, class_index=fresh_class_index)
+        for estimator in fresh.estimators_
+    ]
+    # Oldest trees go first
+    trees = (old_trees + new_trees)[-max_trees:]
+
+    candidate = copy.copy(model)
+    for attribute in ('oob_score_', 'oob_decision_function_'):
+        candidate.__dict__.pop(attribute, None)
+    candidate.estimators_ = trees
+    candidate.n_estimators = len(trees)
+    candidate.classes_ = classes
+    candidate.n_classes_ = n_classes
+    candidate.n_features_in_ = n_features
+    if hasattr(model, 'feature_names_in_'):
+        candidate.feature_names_in_ = extended.get_feature_names_out()
+
+    summary = {
+        'new_rows': len(new_data),
+        'new_categories': int(sum(len(new) - len(old) for new, old in zip(extended.categories_, encoder.categories_))),
+        'new_classes': sorted(set(classes) - set(model.classes_)),
+        'trees_added': len(new_trees),
+        'trees_retired': len(old_trees) + len(new_trees) - len(trees),
+    }
+    return candidate, extended, summary
+
+
+def accuracy(model, encoder, data):
+    return accuracy_score(labels_of(data), model.predict(encoder.transform(data[FEATURE_COLUMNS])))
+
+
+def load_frames(paths, dataset_cache, exclude_threats):
+    # No minimum class size: a small batch may hold only a few rows per threat
+    return clean_stage(load_stage(paths, dataset_cache), 0, exclude_threats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Update a (model, encoder) pickle with newly generated scenarios, gated by a hold-out check."
+    )
+    parser.add_argument('model', help="current (model, encoder) pickle")
+    parser.add_argument('new_data', nargs='+', help="new .csv/.xlsx scenarios, e.g. the generator's threats.csv")
+    parser.add_argument('--holdout', action='append', default=[],
+                        help="fixed evaluation dataset the update must not get worse on (repeatable)")
+    parser.add_argument('--new-holdout-size', type=float, default=0.2,
+                        help="share of the new rows kept back for the check")
+    parser.add_argument('--new-trees', type=int, default=50, help="trees fit on the new rows")
+    parser.add_argument('--max-trees', type=int, help="forest size after retiring the oldest trees (default: current size)")
+    parser.add_argument('--tolerance', type=float, default=0.0, help="accuracy drop still accepted on a hold-out")
+    parser.add_argument('--exclude-threat', action='append', default=[], help="drop a threat class (repeatable)")
+    parser.add_argument('--random-state', type=int, default=None)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('-o', '--output', help="where to write the promoted model (default: overwrite MODEL)")
+    parser.add_argument('--dry-run', action='store_true', help="evaluate only, never write")
+    args = parser.parse_args(argv)
+
+    with open(args.model, 'rb') as file:
+        model, encoder = pickle.load(file)
+
+    dataset_cache = DatasetCache()
+    new_data = load_frames(args.new_data, dataset_cache, args.exclude_threat)
+    if new_data.empty:
+        print("No usable rows in the new data.", file=sys.stderr)
+        return 1
+
+    holdouts = {path: load_frames([path], dataset_cache, args.exclude_threat) for path in args.holdout}
+    if args.new_holdout_size > 0:
+        labels = labels_of(new_data)
+        _, counts = np.unique(labels, return_counts=True)
+        train_rows, holdout_rows = train_test_split(
+            np.arange(len(new_data)), test_size=args.new_holdout_size, random_state=args.random_state,
+            stratify=labels if counts.min() >= 2 else None,
+        )
+        holdouts['new data (held out)'] = new_data.iloc[holdout_rows]
+        new_data = new_data.iloc[train_rows]
+
+    start = time.perf_counter()
+    candidate, extended, summary = incremental_update(
+        model, encoder, new_data, n_new_trees=args.new_trees, max_trees=args.max_trees,
+        random_state=args.random_state, n_jobs=args.n_jobs,
+    )
+    print(
+        f"Fit {summary['trees_added']} trees on {summary['new_rows']} new rows, retired {summary['trees_retired']} "
+        f"({len(candidate.estimators_)} trees now), {summary['new_categories']} new categories, "
+        f"new threats: {summary['new_classes'] or 'none'} ({time.perf_counter() - start:.2f}s)"
+    )
+
+    promote = True
+    for name, data in holdouts.items():
+        current_score = accuracy(model, encoder, data)
+        candidate_score = accuracy(candidate, extended, data)
+        passed = candidate_score >= current_score - args.tolerance
+        promote = promote and passed
+        print(
+            f"{name}: {len(data)} rows, accuracy {current_score:.4f} -> {candidate_score:.4f} "
+            f"{'ok' if passed else 'WORSE'}"
+        )
+    if not holdouts:
+        print("No hold-out data; promoting unchecked.")
+
+    if not promote:
+        print("Update rejected, keeping the current model.")
+        return 1
+    if args.dry_run:
+        print("Update passed (dry run, nothing written).")
+        return 0
+    output = args.output or args.model
+    save_artifact(candidate, extended, output)
+    print(f"Promoted to {os.path.abspath(output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'backend'))
+
+from ThreatModeler_API import SCENARIO_COLUMNS, append_to_csv, parse_response  # noqa: E402
+from dataset_sink import CsvSink  # noqa: E402
+
+
+def scenario_text(name, extra_key=None):
+    lines = [f"{column}: {name} {column.lower()}" for column in SCENARIO_COLUMNS]
+    if extra_key:
+        lines.insert(0, f"{extra_key}: {name}")
+    return "\n".join(lines)
+
+
+def test_append_keeps_scenarios_with_extra_keys(tmp_path, capsys):
+    path = str(tmp_path / 'threats.csv')
+    append_to_csv(pd.DataFrame(parse_response(scenario_text('first'))), path)
+
+    # The model numbered this batch, which adds a "Scenario 2" key the file does not have
+    batch = pd.DataFrame(parse_response(scenario_text('second', extra_key='Scenario 2')))
+    assert 'Scenario 2' in batch.columns
+    assert append_to_csv(batch, path) == 1
+    assert "Scenario 2" in capsys.readouterr().out
+
+    written = pd.read_csv(path)
+    assert list(written.columns) == SCENARIO_COLUMNS
+    assert written['Source Name'].tolist() == ['first source name', 'second source name']
+
+
+def test_csv_sink_refuses_unknown_columns_without_writing(tmp_path):
+    path = str(tmp_path / 'threats.csv')
+    sink = CsvSink(path)
+    sink.append(pd.DataFrame({'a': [1], 'b': [2]}))
+    before = open(path, encoding='utf-8').read()
+
+    with pytest.raises(ValueError, match="'c'"):
+        sink.append(pd.DataFrame({'a': [3], 'c': [4]}))
+    assert open(path, encoding='utf-8').read() == before
+
+    # Columns the frame lacks are left empty
+    sink.append(pd.DataFrame({'b': [5]}))
+    assert pd.read_csv(path)['b'].tolist() == [2, 5]
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src', 'frontend'), os.path.join(ROOT, 'src', 'training')]
+
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+
+from datasets import FEATURE_COLUMNS, DatasetCache  # noqa: E402
+from forest_compiler import check_equivalence, compile_forest  # noqa: E402
+from train import clean_stage, encode_stage, load_stage  # noqa: E402
+
+DATASET = os.path.join(ROOT, 'data', 'data_1.0.1.xlsx')
+
+
+@pytest.fixture(scope='module')
+def training_data(tmp_path_factory):
+    # Same load -> clean -> encode stages as train.py
+    data = load_stage([DATASET], DatasetCache(cache_dir=str(tmp_path_factory.mktemp('datasets'))))
+    data = clean_stage(data, min_class_count=20, exclude_threats=[])
+    X, y, encoder = encode_stage(data)
+    return data, X, y, encoder
+
+
+@pytest.fixture(scope='module', params=[{}, {'max_depth': 6, 'criterion': 'entropy'}], ids=['full', 'shallow'])
+def model(request, training_data):
+    _, X, y, _ = training_data
+    return RandomForestClassifier(n_estimators=25, random_state=0, n_jobs=-1, **request.param).fit(X, y)
+
+
+def test_compiled_forest_matches_model(model, training_data):
+    _, X, _, _ = training_data
+    compiled = compile_forest(model)
+    assert len(check_equivalence(model, compiled, X)) == 0
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_compiled_forest_matches_model_on_unseen_categories(model, training_data):
+    data, _, _, encoder = training_data
+    rows = data[FEATURE_COLUMNS].sample(500, random_state=0).astype(object).reset_index(drop=True)
+    rng = np.random.default_rng(0)
+    for column in FEATURE_COLUMNS:
+        unseen = rng.random(len(rows)) < 0.3
+        rows.loc[unseen, column] = f"never seen {column}"
+        rows.loc[rng.random(len(rows)) < 0.05, column] = None
+    X = encoder.transform(rows)
+    # Unknown values leave their one-hot block empty, so rows have fewer active features
+    assert X.sum(axis=1).min() < len(FEATURE_COLUMNS)
+    assert len(check_equivalence(model, compile_forest(model), X)) == 0
@@ -0,0 +1,35 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src', 'frontend'))
+
+from lru import BoundedLRU  # noqa: E402
+
+
+def test_evicts_least_recently_used_by_weight():
+    cache = BoundedLRU(10)
+    cache.put('a', 'A', 4)
+    cache.put('b', 'B', 4)
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 4)
+    assert cache.get('b') is None
+    assert cache.get_many(['a', 'c']) == ['A', 'C']
+    assert cache.stats() == {'entries': 2, 'weight': 8, 'hits': 3, 'misses': 1}
+
+
+def test_reweighs_replaced_entries_and_skips_oversized_ones():
+    cache = BoundedLRU(10)
+    cache.put('a', 'A', 2)
+    cache.put('b', 'B', 2)
+    cache.put('a', 'A', 9)
+    assert cache.get('b') is None
+    assert cache.weight == 9
+    cache.put('a', 'A', 11)
+    assert len(cache) == 0 and cache.weight == 0
+
+
+def test_put_many_counts_entries():
+    cache = BoundedLRU(2)
+    cache.put_many([(1, 'one'), (2, 'two'), (3, 'three')])
+    assert cache.get_many([1, 2, 3]) == [None, 'two', 'three']